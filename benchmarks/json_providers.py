@@ -0,0 +1,67 @@
+"""
+Compares the JSON providers on a payload that looks like the response of
+`/shares/payment_status`. Run it with the same environment as the application:
+
+    poetry run python -m benchmarks.json_providers [--shares 2000] [--repeat 20]
+"""
+
+import argparse
+import random
+import timeit
+from decimal import Decimal
+
+from solawi.app import JSON_PROVIDERS, app, orjson
+
+
+def payment_status_payload(number_of_shares: int) -> dict:
+    random.seed(0)
+    shares = []
+    for share_id in range(1, number_of_shares + 1):
+        total_deposits = Decimal(random.randint(0, 500000)) / 100
+        expected_today = Decimal(random.randint(0, 500000)) / 100
+        shares.append(
+            {
+                "id": share_id,
+                "name": f"Member {share_id} & Member {share_id + 1}",
+                "total_deposits": total_deposits,
+                "number_of_deposits": random.randint(0, 60),
+                "total_security": Decimal(random.choice([0, 100, 150])),
+                "archived": random.random() < 0.1,
+                "note": random.choice([None, "Zahlt bar", "Überweist quartalsweise"]),
+                "station_name": random.choice(["", "Kreuzberg", "Neukölln"]),
+                "expected_today": expected_today,
+                "difference_today": total_deposits - expected_today,
+            }
+        )
+    return {"shares": shares}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shares", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    payload = payment_status_payload(args.shares)
+    results = {}
+    for name, provider_class in JSON_PROVIDERS.items():
+        if name == "orjson" and orjson is None:
+            print(f"{name}: not installed")
+            continue
+        provider = provider_class(app)
+        results[name] = provider.dumps(payload, separators=(",", ":"))
+        seconds = min(
+            timeit.repeat(
+                lambda: provider.dumps(payload, separators=(",", ":")),
+                number=1,
+                repeat=args.repeat,
+            )
+        )
+        print(f"{name}: {seconds * 1000:.2f} ms for {args.shares} shares")
+
+    if len(set(results.values())) > 1:
+        print("The providers produced different output!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+-- The same rules as `get_expected_today` but written as a single SQL expression
+-- that only depends on its arguments. This allows Postgres to inline the function
+-- into the calling query and to evaluate it in parallel workers.
+CREATE OR REPLACE FUNCTION get_expected_at(start_date date,
+                                           end_date date,
+                                           amount numeric,
+                                           today date)
+RETURNS numeric
+LANGUAGE sql
+IMMUTABLE
+PARALLEL SAFE
+AS
+$$
+SELECT amount * (
+    -- full months between the start and the end of the bet (or today)
+    GREATEST(
+        (DATE_PART('year', LEAST(end_date, today))::integer - DATE_PART('year', start_date)::integer) * 12
+        + DATE_PART('month', LEAST(end_date, today))::integer - DATE_PART('month', start_date)::integer,
+        0
+    )
+    -- from the 27th on, the payment for the next month is due
+    + CASE WHEN DATE_PART('day', LEAST(end_date, today)) >= 27 THEN 1 ELSE 0 END
+    -- if this bet is still active, we expect them to have payed
+    -- for the following month already
+    + CASE WHEN today > start_date AND end_date IS NULL THEN 1 ELSE 0 END
+    -- bets that were started at mid-month only pay half of the first month, unless
+    -- today is a new month (but no full month in the delta yet)
+    + CASE
+        WHEN DATE_PART('day', start_date) < 15 THEN 0
+        WHEN DATE_PART('day', LEAST(end_date, today)) - DATE_PART('day', start_date) > 16 THEN 0.5
+        ELSE -0.5
+      END
+)
+$$;
@@ -0,0 +1,31 @@
+"""Add payment status snapshot
+
+Revision ID: 0124beec821b
+Revises: e515c374708a
+Create Date: 2026-10-18 10:12:31.402817
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '0124beec821b'
+down_revision = 'e515c374708a'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('payment_status',
+    sa.Column('share_id', sa.Integer(), nullable=False),
+    sa.Column('total_deposits', sa.Numeric(), nullable=False),
+    sa.Column('total_security', sa.Numeric(), nullable=False),
+    sa.Column('number_of_deposits', sa.Integer(), nullable=False),
+    sa.Column('expected_today', sa.Numeric(), nullable=False),
+    sa.Column('calculated_on', sa.Date(), nullable=False),
+    sa.ForeignKeyConstraint(['share_id'], ['share.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('share_id')
+    )
+
+
+def downgrade():
+    op.drop_table('payment_status')
@@ -0,0 +1,26 @@
+"""Add table revision
+
+Revision ID: 5f2c9e7b1d34
+Revises: 8d1f0c3a5e27
+Create Date: 2026-10-18 14:21:05.402117
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5f2c9e7b1d34'
+down_revision = '8d1f0c3a5e27'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('table_revision',
+    sa.Column('table_name', sa.String(), nullable=False),
+    sa.Column('revision', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('table_name')
+    )
+
+
+def downgrade():
+    op.drop_table('table_revision')
@@ -0,0 +1,27 @@
+"""Add token revocation
+
+Revision ID: 8d1f0c3a5e27
+Revises: 0124beec821b
+Create Date: 2026-10-18 11:02:47.118362
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '8d1f0c3a5e27'
+down_revision = '0124beec821b'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('token_revocation',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('revoked_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('token_revocation')
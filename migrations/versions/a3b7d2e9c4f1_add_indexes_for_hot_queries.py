@@ -0,0 +1,32 @@
+"""Add indexes for hot queries
+
+Revision ID: a3b7d2e9c4f1
+Revises: 5f2c9e7b1d34
+Create Date: 2026-10-18 16:40:12.731904
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'a3b7d2e9c4f1'
+down_revision = '5f2c9e7b1d34'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_index(op.f('ix_bet_share_id'), 'bet', ['share_id'], unique=False)
+    op.create_index(op.f('ix_deposit_added_by'), 'deposit', ['added_by'], unique=False)
+    op.create_index('ix_deposit_person_id', 'deposit', ['person_id'], unique=False, postgresql_include=['amount', 'is_security', 'ignore'])
+    op.create_index('ix_deposit_imported_timestamp', 'deposit', ['timestamp'], unique=False, postgresql_where=sa.text('added_by IS NULL'))
+    op.create_index(op.f('ix_member_share_id'), 'member', ['share_id'], unique=False)
+    op.create_index(op.f('ix_person_share_id'), 'person', ['share_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_person_share_id'), table_name='person')
+    op.drop_index(op.f('ix_member_share_id'), table_name='member')
+    op.drop_index('ix_deposit_imported_timestamp', table_name='deposit', postgresql_where=sa.text('added_by IS NULL'))
+    op.drop_index('ix_deposit_person_id', table_name='deposit', postgresql_include=['amount', 'is_security', 'ignore'])
+    op.drop_index(op.f('ix_deposit_added_by'), table_name='deposit')
+    op.drop_index(op.f('ix_bet_share_id'), table_name='bet')
@@ -0,0 +1,27 @@
+"""Add immutable get_expected_at
+
+Revision ID: c61e4f0b8a2d
+Revises: a3b7d2e9c4f1
+Create Date: 2026-10-18 17:12:54.208113
+
+"""
+from migrations.utils import get_sql
+
+# revision identifiers, used by Alembic.
+revision = 'c61e4f0b8a2d'
+down_revision = 'a3b7d2e9c4f1'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    connection = op.get_bind()
+
+    connection.execute(get_sql('get_expected_at_1.sql'))
+
+
+def downgrade():
+    connection = op.get_bind()
+
+    connection.execute(sa.text('DROP FUNCTION get_expected_at(date, date, numeric, date)'))
@@ -1,20 +1,49 @@
+import hashlib
 from datetime import date
 from decimal import Decimal
 from functools import wraps
 from http import HTTPStatus
-from typing import Optional
-
-from flask import Blueprint, current_app, jsonify, request
-from flask_jwt_extended import create_access_token, get_jwt_identity, verify_jwt_in_request
+from typing import Iterable, Literal, Optional, Union
+
+from flask import (
+    Blueprint,
+    current_app,
+    g,
+    jsonify,
+    make_response,
+    request,
+    stream_with_context,
+)
+from flask_jwt_extended import (
+    create_access_token,
+    get_jwt,
+    get_jwt_identity,
+    verify_jwt_in_request,
+)
 from flask_pydantic import validate
-from pydantic import BaseModel, ConfigDict, StringConstraints
-from sqlalchemy.orm import joinedload
+from pydantic import BaseModel, ConfigDict, Field, StringConstraints, ValidationError
+from sqlalchemy import select
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy.orm import selectinload
 from typing_extensions import Annotated
 
-from solawi import models
+from solawi import concurrent_reads, models, read_models
 from solawi.app import app, db
-from solawi.controller import merge
-from solawi.models import Bet, Deposit, Member, Person, Share, User
+from solawi.auth import claims_for, load_user, revocations, user_cache, user_from_claims
+from solawi.controller import add_deposits, merge, split_deposits, update_deposits
+from solawi.models import (
+    STREAM_BATCH_SIZE,
+    Bet,
+    Deposit,
+    Member,
+    PaymentStatus,
+    Person,
+    Share,
+    Station,
+    TableRevision,
+    User,
+    paginate,
+)
 
 api = Blueprint("api", __name__)
 
@@ -24,7 +53,21 @@ def login_required(skip_needs_change_check=False):
         @wraps(fn)
         def decorator(*args, **kwargs):
             verify_jwt_in_request()
-            current_user = User.query.filter(User.email == get_jwt_identity()).one()
+            claims = get_jwt()
+            current_user = None
+            if current_app.config["JWT_CLAIMS_AUTHORIZATION"] and request.method in ("GET", "HEAD"):
+                # Read requests trust the token if it describes an active user
+                # who does not need to change their password
+                current_user = user_from_claims(get_jwt_identity(), claims)
+                if current_user and not (current_user.active and current_user.password_changed_at):
+                    current_user = None
+            if current_user is None:
+                current_user = load_user(get_jwt_identity())
+            if current_user is None or not current_user.active:
+                return jsonify({"message": "This user is not active"}), 401
+            if revocations.is_revoked(current_user.id, claims["iat"]):
+                return jsonify({"message": "This token has been revoked"}), 401
+            g.current_user = current_user
             if not skip_needs_change_check and not current_user.password_changed_at:
                 return jsonify({"message": "You must change your password before continuing"}), 403
             return current_app.ensure_sync(fn)(*args, **kwargs)
@@ -34,6 +77,38 @@ def login_required(skip_needs_change_check=False):
     return wrapper
 
 
+def conditional(*models, daily=False):
+    """
+    Sets an ETag that is derived from the revisions of the tables of `models` and the
+    query string. Requests whose `If-None-Match` matches are answered with 304 without
+    calling the view. `daily` must be set if the response also depends on the date.
+    """
+    table_names = [model.__table__.name for model in models]
+
+    def wrapper(fn):
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            revisions = TableRevision.get_revisions(table_names)
+            parts = [request.full_path]
+            parts += [f"{name}:{revisions.get(name, 0)}" for name in table_names]
+            if daily:
+                parts.append(date.today().isoformat())
+            etag = hashlib.sha1("\n".join(parts).encode()).hexdigest()
+
+            if request.if_none_match.contains(etag):
+                response = current_app.response_class(status=HTTPStatus.NOT_MODIFIED)
+            else:
+                response = make_response(current_app.ensure_sync(fn)(*args, **kwargs))
+                if response.status_code != HTTPStatus.OK:
+                    return response
+            response.set_etag(etag)
+            return response
+
+        return decorator
+
+    return wrapper
+
+
 class LoginSchema(BaseModel):
     email: str
     password: str
@@ -46,18 +121,61 @@ def api_login(body: LoginSchema):
     password = body.password
     user = models.User.authenticate_and_get(email, password)
     if user:
-        access_token = create_access_token(identity=email)
+        access_token = create_access_token(identity=email, additional_claims=claims_for(user))
         return jsonify(access_token=access_token, id=user.id), 200
     else:
         return jsonify({"message": "login failed"}), 401
 
 
+class ListQuery(BaseModel):
+    limit: Optional[Annotated[int, Field(gt=0)]] = None
+    after: Optional[int] = None
+    fields: Optional[str] = None
+
+
+def list_response(name: str, items: Iterable[dict], query: ListQuery):
+    """
+    Streams `items` (which were fetched with `paginate`) as a list named `name`.
+    Every item is encoded on its own as it is read so that the whole list never has
+    to be held in memory.
+    If a limit was given, `next` holds the cursor for the following page or `None` if
+    this is the last page. `fields` restricts the items to the given (comma separated)
+    keys, the id is always included.
+    """
+    fields = {"id", *query.fields.split(",")} if query.fields else None
+
+    def dumps(value):
+        return current_app.json.dumps(value, separators=(",", ":"))
+
+    def generate():
+        yield f'{{"{name}":['
+        last_id = None
+        has_more = False
+        for position, item in enumerate(items):
+            if position == query.limit:
+                has_more = True
+                break
+            if fields:
+                item = {key: value for key, value in item.items() if key in fields}
+            yield ("," if position else "") + dumps(item)
+            last_id = item["id"]
+        yield "]"
+        if query.limit is not None:
+            yield ',"next":' + dumps(last_id if has_more else None)
+        yield "}\n"
+
+    return current_app.response_class(
+        stream_with_context(generate()), mimetype=current_app.json.mimetype
+    )
+
+
 @api.route("/shares")
 @login_required()
-def shares_list():
-    shares = Share.query.options(joinedload(Share.bets)).options(joinedload(Share.members)).all()
-    shares = [share.json for share in shares]
-    return jsonify(shares=shares)
+@conditional(Share, Bet, Member)
+@validate()
+def shares_list(query: ListQuery):
+    shares = read_models.share_list(after=query.after, limit=query.limit)
+    return list_response("shares", shares, query)
 
 
 @api.route("/shares/<int:share_id>/emails")
@@ -69,19 +187,13 @@ def share_email_list(share_id: int):
 
 @api.route("/members", methods=["GET"])
 @login_required()
-def member_list():
-    members = db.session.query(Member).options(joinedload(Member.share)).all()
-    result = []
-
-    if request.args.get("active"):
-        members = [member for member in members if member.share.currently_active]
-
-    for member in members:
-        json = member.json
-        json["station_name"] = member.share.station_name if member.share else ""
-        json["join_date"] = member.share.join_date if member.share else ""
-        result.append(json)
-    return jsonify(members=result)
+@conditional(Member, Share, Bet, Station, daily=True)
+@validate()
+def member_list(query: ListQuery):
+    members = Member.get_list(
+        active_only=bool(request.args.get("active")), after=query.after, limit=query.limit
+    )
+    return list_response("members", members, query)
 
 
 class MemberSchema(BaseModel):
@@ -133,61 +245,65 @@ def member_delete(member_id: int):
 
 @api.route("/shares/payment_status", methods=["GET"])
 @login_required()
-def get_payment_list():
-    deposit_map = Share.get_deposit_map()
-    expected_amount_map = Share.get_expected_amount_map()
-    shares = (
-        db.session.query(Share)
-        .options(joinedload(Share.members))
-        .options(joinedload(Share.station))
-        .all()
-    )
-    res = []
-    for share in shares:
-        deposit_details = deposit_map.get(share.id, {})
-        share_payments = {
-            "id": share.id,
-            "name": share.name,
-            "total_deposits": deposit_details.get("total_deposits") or 0,
-            "number_of_deposits": deposit_details.get("number_of_deposits") or 0,
-            "total_security": deposit_details.get("total_security") or 0,
-            "archived": share.archived,
-            "note": share.note,
-            "station_name": share.station.name if share.station else "",
-            "expected_today": expected_amount_map.get(share.id) or 0,
-        }
-        share_payments["difference_today"] = (
-            share_payments["total_deposits"] - share_payments["expected_today"]
-        )
-        res.append(share_payments)
-    return jsonify(shares=res)
+@conditional(Share, Member, Station, Person, Deposit, Bet, daily=True)
+@validate()
+def get_payment_list(query: ListQuery):
+    if current_app.config["CONCURRENT_READS"]:
+        shares = concurrent_reads.payment_status_list(after=query.after, limit=query.limit)
+        return list_response("shares", shares, query)
+    PaymentStatus.refresh_outdated()
+    shares = read_models.payment_status_list(after=query.after, limit=query.limit)
+    return list_response("shares", shares, query)
 
 
 @api.route("/stations")
 @login_required()
-def get_stations():
-    stations = [station.json for station in models.Station.query.all()]
-    return jsonify(stations=stations)
+@conditional(Station)
+@validate()
+def get_stations(query: ListQuery):
+    stations = paginate(select(*Station.json_columns()), Station.id, query.after, query.limit)
+    stations = db.session.execute(stations.execution_options(yield_per=STREAM_BATCH_SIZE))
+    return list_response("stations", map(Station.json_from_row, stations), query)
 
 
 @api.route("/shares/<int:share_id>", methods=["GET"])
 @login_required()
 def shares_details(share_id: int):
-    share = db.get_or_404(Share, share_id)
-    dict_share = share.json
-    dict_share["expected_today"] = share.expected_today
-    dict_share["total_deposits"] = share.total_deposits or 0
-    dict_share["difference_today"] = -(
-        Decimal(dict_share["expected_today"]) - dict_share["total_deposits"]
+    share = db.first_or_404(
+        select(Share)
+        .options(selectinload(Share.bets))
+        .options(selectinload(Share.members))
+        .where(Share.id == share_id)
     )
+    dict_share = share.json
+    dict_share.update(Share.get_payment_summary(share_id))
+    dict_share["difference_today"] = dict_share["total_deposits"] - dict_share["expected_today"]
     return jsonify(share=dict_share)
 
 
+@api.route("/shares/<int:share_id>/timeline", methods=["GET"])
+@login_required()
+def share_timeline(share_id: int):
+    db.get_or_404(Share, share_id)
+    timeline = Share.get_timelines(share_id).get(share_id, [])
+    return jsonify(timeline=timeline)
+
+
+@api.route("/shares/timeline", methods=["GET"])
+@login_required()
+def shares_timeline():
+    timelines = Share.get_timelines()
+    shares = [{"id": share_id, "timeline": timeline} for share_id, timeline in timelines.items()]
+    return jsonify(shares=shares)
+
+
 @api.route("/shares/<int:share_id>/deposits", methods=["GET"])
 @login_required()
-def share_deposits(share_id: int):
-    deposits = Share.get_deposits(share_id)
-    return jsonify(deposits=deposits)
+@conditional(Deposit, Person, User)
+@validate()
+def share_deposits(share_id: int, query: ListQuery):
+    deposits = Share.get_deposits(share_id, after=query.after, limit=query.limit)
+    return list_response("deposits", deposits, query)
 
 
 @api.route("/shares/<int:share_id>/bets", methods=["GET"])
@@ -317,9 +433,7 @@ class DepositSchema(DepositPatchSchema):
 @login_required()
 @validate()
 def post_deposit(body: DepositSchema):
-    current_user_email = get_jwt_identity()
-    current_user = User.query.filter(User.email == current_user_email).one()
-    deposit = Deposit(added_by=current_user.id)
+    deposit = Deposit(added_by=g.current_user.id)
     json = body.model_dump()
     for field in json:
         setattr(deposit, field, json.get(field))
@@ -327,16 +441,171 @@ def post_deposit(body: DepositSchema):
     return jsonify(deposit=deposit.json)
 
 
+class BulkDepositSchema(BaseModel):
+    deposits: Annotated[list[DepositSchema], Field(min_length=1)]
+
+
+@api.post("/deposits/bulk")
+@login_required()
+@validate()
+def post_deposits(body: BulkDepositSchema):
+    deposits = [deposit.model_dump() for deposit in body.deposits]
+    try:
+        ids = add_deposits(deposits, added_by=g.current_user.id)
+    except DBAPIError as error:
+        # e.g. an unknown person, an invalid timestamp or an amount that is too large
+        db.session.rollback()
+        return jsonify({"message": str(error.orig)}), 400
+    return jsonify(
+        deposits=[
+            {"id": deposit_id, "status": "duplicate" if deposit_id is None else "created"}
+            for deposit_id in ids
+        ]
+    )
+
+
+class BulkDepositPatchSchema(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    changes: DepositPatchSchema
+    # the deposits to change, at least one of these filters must be given
+    ids: Optional[list[int]] = None
+    person_id: Optional[int] = None
+    share_id: Optional[int] = None
+    from_date: Optional[date] = None
+    to_date: Optional[date] = None
+    title_pattern: Optional[str] = None
+
+
+@api.patch("/deposits/bulk")
+@login_required()
+@validate()
+def patch_deposits(body: BulkDepositPatchSchema):
+    # the columns are not nullable, so a null is not a change
+    changes = body.changes.model_dump(exclude_none=True)
+    filters = body.model_dump(exclude={"changes"}, exclude_none=True)
+    if not changes or not filters:
+        return jsonify({"message": "At least one change and one filter are required"}), 400
+    return jsonify(ids=update_deposits(changes, **filters))
+
+
+class BatchShareSchema(SharePatchSchema):
+    station_id: Optional[int] = None
+
+
+class BatchBetSchema(BetSchema):
+    share_id: int
+
+
+class BatchOperationSchema(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    op: Literal["create_share", "update_share", "create_member", "create_bet", "create_deposit"]
+    # the share for `update_share`
+    id: Optional[Union[int, Annotated[str, StringConstraints(pattern=r"^\$\d+$")]]] = None
+    # `id` and the `*_id` fields may reference the result of an earlier operation as "$<index>"
+    data: dict = {}
+
+
+class BatchSchema(BaseModel):
+    operations: Annotated[list[BatchOperationSchema], Field(min_length=1)]
+
+
+class BatchError(Exception):
+    pass
+
+
+def _resolve(value, instances: list):
+    """Replaces a reference like "$0" with the id of the object that operation 0 returned"""
+    if not (isinstance(value, str) and value.startswith("$")):
+        return value
+    index = value[1:]
+    if not index.isdigit() or int(index) >= len(instances):
+        raise BatchError(f"{value} does not reference an earlier operation")
+    return instances[int(index)].id
+
+
+def _create_share(data, _):
+    return Share(**BatchShareSchema.model_validate(data).model_dump(exclude_unset=True))
+
+
+def _update_share(data, share_id):
+    share = db.session.get(Share, share_id)
+    if share is None:
+        raise BatchError(f"Share {share_id} does not exist")
+    for key, value in BatchShareSchema.model_validate(data).model_dump(exclude_unset=True).items():
+        setattr(share, key, value)
+    return share
+
+
+def _create_member(data, _):
+    body = MemberSchema.model_validate(data)
+    share = db.session.get(Share, body.share_id) if body.share_id else Share()
+    if share is None:
+        raise BatchError(f"Share {body.share_id} does not exist")
+    return Member(name=body.name, email=body.email, phone=body.phone, share=share)
+
+
+def _create_bet(data, _):
+    return Bet(**BatchBetSchema.model_validate(data).model_dump())
+
+
+def _create_deposit(data, _):
+    return Deposit(added_by=g.current_user.id, **DepositSchema.model_validate(data).model_dump())
+
+
+BATCH_OPERATIONS = {
+    "create_share": _create_share,
+    "update_share": _update_share,
+    "create_member": _create_member,
+    "create_bet": _create_bet,
+    "create_deposit": _create_deposit,
+}
+
+
+@api.post("/batch")
+@login_required()
+@validate()
+def batch(body: BatchSchema):
+    """
+    Runs all operations in order in one transaction and returns the resulting objects.
+    If one of them fails, nothing is saved.
+    """
+    instances = []
+    for index, operation in enumerate(body.operations):
+        try:
+            data = {
+                key: _resolve(value, instances) if key.endswith("_id") else value
+                for key, value in operation.data.items()
+            }
+            instance = BATCH_OPERATIONS[operation.op](data, _resolve(operation.id, instances))
+            db.session.add(instance)
+            db.session.flush()
+        except (BatchError, ValidationError, DBAPIError) as error:
+            db.session.rollback()
+            message = str(error.orig) if isinstance(error, DBAPIError) else str(error)
+            return jsonify({"message": message, "operation": index}), 400
+        instances.append(instance)
+    db.session.commit()
+    results = [instance.json for instance in instances]
+    return jsonify(results=results)
+
+
 class MergeSharesSchema(BaseModel):
     share1: int
     share2: int
+    # further shares that are merged into `share1` as well
+    more_shares: list[int] = []
 
 
 @api.route("/shares/merge", methods=["POST"])
 @login_required()
 @validate()
 def merge_shares(body: MergeSharesSchema):
-    merge(body.share1, body.share2)
+    if not {body.share2, *body.more_shares} - {body.share1}:
+        return jsonify({"message": "A share cannot be merged into itself"}), 400
+    if merge(body.share1, body.share2, *body.more_shares) is None:
+        return jsonify({"message": "Share not found"}), 404
     return jsonify(message="success")
 
 
@@ -346,6 +615,26 @@ def get_person(person_id: int):
     return jsonify(Person.get(person_id).json)
 
 
+class SplitDepositsSchema(BaseModel):
+    share_id: int
+    date: date
+    dry_run: bool = False
+
+
+@api.route("/person/<int:person_id>/split", methods=["POST"])
+@login_required()
+@validate()
+def split_person_deposits(person_id: int, body: SplitDepositsSchema):
+    db.get_or_404(Person, person_id)
+    db.get_or_404(Share, body.share_id)
+    try:
+        result = split_deposits(person_id, body.share_id, body.date, body.dry_run)
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"message": "The deposits were already split at this date"}), 409
+    return jsonify(result._asdict())
+
+
 @api.route("/users", methods=["GET"])
 @login_required()
 def user_list():
@@ -362,11 +651,11 @@ class PatchUserModel(BaseModel):
 @validate()
 def modify_user(body: PatchUserModel, id: int):
     user = User.get(id)
-    current_user_email = get_jwt_identity()
-    if not user or not user.email == current_user_email:
+    if not user or not user.id == g.current_user.id:
         return jsonify({"message": "you cannot change another users's password"}), 403
     user.password = body.password
     user.save()
+    user_cache.invalidate(user.email)
     return jsonify(user=user.json)
 
 
@@ -1,9 +1,11 @@
 import logging
 import os
+import re
 import sys
 from datetime import date, datetime
 from decimal import Decimal
 
+import psycopg2
 import sentry_sdk
 from flask import Flask
 from flask.json.provider import DefaultJSONProvider
@@ -15,6 +17,11 @@ from flask_sqlalchemy import SQLAlchemy
 from sentry_sdk.integrations.flask import FlaskIntegration
 from sentry_sdk.integrations.sqlalchemy import SqlalchemyIntegration
 
+try:
+    import orjson
+except ImportError:  # orjson is an optional dependency, see `JSON_PROVIDER`
+    orjson = None
+
 secret_key = os.environ.get("SECRET_KEY")
 if secret_key is None:
     raise Exception("You must supply the `SECRET_KEY` environment variable.")
@@ -44,15 +51,113 @@ class CustomJSONProvider(DefaultJSONProvider):
         return super().default(o)
 
 
+class OrjsonJSONProvider(CustomJSONProvider):
+    """
+    Encodes compact output (which is what `jsonify` produces unless in debug mode)
+    with orjson, which serializes dates natively and only calls back into Python for
+    Decimals. The output is the same as that of `CustomJSONProvider` except for native
+    floats: orjson writes small floats without an exponent (`0.00001` instead of
+    `1e-05`) and NaN and infinity as `null`. The API returns amounts as Decimals,
+    which are encoded exactly like the default provider does.
+    """
+
+    # The stdlib encoder escapes everything outside of printable ASCII
+    _non_ascii = re.compile("[\x7f-\U0010ffff]")
+    _options = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS if orjson else None
+
+    @staticmethod
+    def _escape(match):
+        code_point = ord(match.group())
+        if code_point > 0xFFFF:
+            code_point -= 0x10000
+            high, low = 0xD800 | (code_point >> 10), 0xDC00 | (code_point & 0x3FF)
+            return f"\\u{high:04x}\\u{low:04x}"
+        return f"\\u{code_point:04x}"
+
+    def _orjson_default(self, o):
+        if isinstance(o, Decimal):
+            value = float(o)
+            if 0 < abs(value) < 1e-4:
+                # orjson writes these as e.g. `1e-7`, the stdlib as `1e-07`
+                return orjson.Fragment(repr(value))
+            return value
+        return self.default(o)
+
+    def dumps(self, obj, **kwargs):
+        if kwargs != {"separators": (",", ":")}:
+            return super().dumps(obj, **kwargs)
+        encoded = orjson.dumps(obj, default=self._orjson_default, option=self._options).decode()
+        if encoded.isascii() and "\x7f" not in encoded:
+            return encoded
+        return self._non_ascii.sub(self._escape, encoded)
+
+
+JSON_PROVIDERS = {"default": CustomJSONProvider, "orjson": OrjsonJSONProvider}
+
+
+def engine_options(environ) -> dict:
+    """
+    The connection pool settings. Each gunicorn worker has its own pool, so the
+    database needs to accept `workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW)` connections.
+    """
+    return {
+        "pool_size": int(environ.get("DB_POOL_SIZE", 5)),
+        "max_overflow": int(environ.get("DB_MAX_OVERFLOW", 10)),
+        "pool_timeout": int(environ.get("DB_POOL_TIMEOUT", 30)),
+        "pool_recycle": int(environ.get("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": environ.get("DB_POOL_PRE_PING", "true").lower() == "true",
+    }
+
+
+def gevent_wait_callback(connection, timeout=None):
+    """
+    Lets psycopg2 yield to other greenlets while it waits for the database
+    instead of blocking the whole gevent worker.
+    """
+    from gevent.socket import wait_read, wait_write
+
+    while True:
+        state = connection.poll()
+        if state == psycopg2.extensions.POLL_OK:
+            break
+        elif state == psycopg2.extensions.POLL_READ:
+            wait_read(connection.fileno(), timeout=timeout)
+        elif state == psycopg2.extensions.POLL_WRITE:
+            wait_write(connection.fileno(), timeout=timeout)
+        else:
+            raise psycopg2.OperationalError(f"Bad result from poll: {state!r}")
+
+
+def is_gevent_patched() -> bool:
+    # gunicorn's gevent worker monkey patches the standard library before loading the app
+    if "gevent" not in sys.modules:
+        return False
+    from gevent import monkey
+
+    return monkey.is_module_patched("socket")
+
+
+if is_gevent_patched():
+    psycopg2.extensions.set_wait_callback(gevent_wait_callback)
+
 app = Flask(__name__)
 app.config["SQLALCHEMY_DATABASE_URI"] = db_url
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(os.environ)
 app.config["SECRET_KEY"] = secret_key
 app.config["JWT_ACCESS_TOKEN_EXPIRES"] = 60 * 60
+app.config["USER_CACHE_TTL"] = int(os.environ.get("USER_CACHE_TTL", 60))
+app.config["JWT_CLAIMS_AUTHORIZATION"] = (
+    os.environ.get("JWT_CLAIMS_AUTHORIZATION", "false").lower() == "true"
+)
 app.debug = os.environ.get("DEBUG", False)
 app.logger.addHandler(logging.StreamHandler(sys.stdout))
 app.logger.setLevel(logging.ERROR)
-app.json = CustomJSONProvider(app)
+app.config["JSON_PROVIDER"] = os.environ.get("JSON_PROVIDER", "default")
+if app.config["JSON_PROVIDER"] == "orjson" and orjson is None:
+    raise Exception("`JSON_PROVIDER` is set to `orjson` but orjson is not installed.")
+app.json = JSON_PROVIDERS[app.config["JSON_PROVIDER"]](app)
+app.config["CONCURRENT_READS"] = os.environ.get("CONCURRENT_READS", "false").lower() == "true"
 
 jwt = JWTManager(app)
 
@@ -0,0 +1,138 @@
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import NamedTuple, Optional
+
+from flask import current_app
+from sqlalchemy import select
+
+from solawi.app import db
+from solawi.models import TokenRevocation, User
+
+
+class CachedUser(NamedTuple):
+    id: int
+    email: str
+    active: bool
+    password_changed_at: Optional[date]
+
+
+class UserCache:
+    """
+    A small process-local cache for the users that are looked up on every
+    authenticated request. Entries expire after `USER_CACHE_TTL` seconds.
+    Changes that are made in the same process (e.g. through the API) invalidate
+    the entry right away, changes from other processes (e.g. the CLI) become
+    visible once the entry expired.
+    """
+
+    def __init__(self):
+        self._entries: dict[str, tuple[float, CachedUser]] = {}
+
+    def get(self, email: str) -> Optional[CachedUser]:
+        entry = self._entries.get(email)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at < time.monotonic():
+            self._entries.pop(email, None)
+            return None
+        return user
+
+    def set(self, user: CachedUser):
+        ttl = current_app.config["USER_CACHE_TTL"]
+        if ttl > 0:
+            self._entries[user.email] = (time.monotonic() + ttl, user)
+
+    def invalidate(self, email: str):
+        self._entries.pop(email, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+def load_user(email: str) -> Optional[CachedUser]:
+    user = user_cache.get(email)
+    if user is None:
+        row = db.session.execute(
+            select(User.id, User.email, User.active, User.password_changed_at).where(
+                User.email == email
+            )
+        ).one_or_none()
+        if row is None:
+            return None
+        user = CachedUser(*row)
+        user_cache.set(user)
+    return user
+
+
+def claims_for(user: User) -> dict:
+    """
+    The additional claims that are embedded into access tokens so that
+    read requests can be authorised without looking up the user.
+    """
+    password_changed_at = user.password_changed_at
+    return {
+        "uid": user.id,
+        "active": user.active,
+        "password_changed_at": password_changed_at.isoformat() if password_changed_at else None,
+    }
+
+
+def user_from_claims(email: str, claims: dict) -> Optional[CachedUser]:
+    """
+    Returns the user as described by the token's claims or `None` if the token does
+    not contain all claims (e.g. because it was issued before they were introduced).
+    """
+    if not {"uid", "active", "password_changed_at"} <= claims.keys():
+        return None
+    password_changed_at = claims["password_changed_at"]
+    if password_changed_at:
+        password_changed_at = date.fromisoformat(password_changed_at)
+    return CachedUser(claims["uid"], email, claims["active"], password_changed_at)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class RevocationList:
+    """
+    A process-local copy of the `TokenRevocation` table which is reloaded every
+    `USER_CACHE_TTL` seconds. Only revocations that are younger than the maximum
+    lifetime of a token are loaded as older tokens are expired anyway, so this list
+    is usually empty and checking a token costs nothing.
+    """
+
+    def __init__(self):
+        self._revoked: dict[int, datetime] = {}
+        self._expires_at = None
+
+    def _get(self) -> dict[int, datetime]:
+        if self._expires_at is None or self._expires_at < time.monotonic():
+            since = _utcnow() - timedelta(seconds=current_app.config["JWT_ACCESS_TOKEN_EXPIRES"])
+            self._revoked = TokenRevocation.get_revoked_since(since)
+            self._expires_at = time.monotonic() + current_app.config["USER_CACHE_TTL"]
+        return self._revoked
+
+    def is_revoked(self, user_id: int, issued_at: int) -> bool:
+        revoked = self._get()
+        if not revoked or user_id not in revoked:
+            return False
+        return (
+            datetime.fromtimestamp(issued_at, timezone.utc).replace(tzinfo=None) <= revoked[user_id]
+        )
+
+    def revoke(self, user_id: int):
+        revoked_at = _utcnow()
+        TokenRevocation.revoke(user_id, revoked_at)
+        self._revoked[user_id] = revoked_at
+
+    def clear(self):
+        self._revoked = {}
+        self._expires_at = None
+
+
+revocations = RevocationList()
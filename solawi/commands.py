@@ -1,10 +1,14 @@
 from getpass import getpass
 
 import click
+from sqlalchemy.exc import IntegrityError
 
+from solawi import controller
 from solawi.app import app, db
-from solawi.fints_import import import_fin_ts
-from solawi.models import Deposit, Person, Share, User
+from solawi.auth import revocations, user_cache
+from solawi.fints_import import import_fin_ts, save_transactions
+from solawi.models import PaymentStatus, Person, Share, User
+from solawi.statement_files import CAMT053, MT940, read_statement_file
 
 
 @app.cli.command()
@@ -28,56 +32,99 @@ def change_password(email):
     user.password = getpass()
     user.password_changed_at = None
     user.save()
+    user_cache.invalidate(user.email)
+    revocations.revoke(user.id)
     click.echo(f"Updated user {user}")
 
 
+@app.cli.command()
+@click.argument("email")
+def deactivate_user(email):
+    """Deactivate a user so that they can no longer use the application"""
+    user = User.get_by_email(email)
+    if not user:
+        raise click.UsageError(f'No active user found for e-mail "{email}"')
+    user.active = False
+    user.save()
+    user_cache.invalidate(user.email)
+    revocations.revoke(user.id)
+    click.echo(f"Deactivated user {user.email}")
+
+
 @app.cli.command()
 @click.option("--interactive/--non-interactive", default=False)
 def import_statements(interactive):
     import_fin_ts(interactive)
 
 
+@app.cli.command()
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--format",
+    "file_format",
+    type=click.Choice([MT940, CAMT053]),
+    help="Defaults to camt053 for .xml files and mt940 for all other files",
+)
+@click.option("--encoding", default="utf-8", help="The encoding of MT940 files")
+def import_file(path, file_format, encoding):
+    """Import deposits from an MT940 or CAMT.053 statement file"""
+    transactions = read_statement_file(path, file_format, encoding)
+    result = save_transactions(transactions)
+    click.echo(f"Imported {result.inserted} transactions, skipped {result.skipped} duplicates")
+
+
+@app.cli.command()
+def refresh_payment_status():
+    """Recalculate the payment status of all shares.
+    This should run once per night so that the expected amounts are rolled forward.
+    """
+    PaymentStatus.refresh()
+    db.session.commit()
+    click.echo("Refreshed the payment status of all shares")
+
+
 @app.cli.command()
 @click.argument("person_id")
 @click.argument("share_id")
 @click.argument("date")
-def split_deposits(person_id, share_id, date):
+@click.option("--dry-run", is_flag=True, help="Only report which deposits would be moved")
+def split_deposits(person_id, share_id, date, dry_run):
     """Takes deposits of a given person and creates a new virtual person where
     all deposits made before `date` are assigned to this person.
     The existing person is then assigned to deposit into `share_id`.
     This is to be used in case a person switches their share but continues to deposit money.
     """
 
-    _split_deposits(person_id, share_id, date)
+    _split_deposits(person_id, share_id, date, dry_run)
 
 
-def _split_deposits(person_id, share_id, date):
+def _split_deposits(person_id, share_id, date, dry_run=False):
     """This is split for easier testability"""
-    person = Person.get(person_id)
-
-    virtual_person = Person(
-        name=person.name + " [alt - vom Kontotool erstellt]", share_id=person.share_id
-    )
-    db.session.add(virtual_person)
-
-    person.share_id = share_id
-    db.session.add(person)
-
-    deposits = (
-        Deposit.query.filter(Deposit.person_id == person_id).filter(Deposit.timestamp < date).all()
-    )
-
-    for deposit in deposits:
-        deposit.person_id = virtual_person.id
-        db.session.add(deposit)
-
     newly_assigned_share = Share.get(share_id)
-    moved_deposits = Deposit.query.filter(Deposit.person_id == person.id).count()
+    if newly_assigned_share is None:
+        raise click.UsageError(f"No share found with ID {share_id}")
+    share_name = newly_assigned_share.name
+    try:
+        result = controller.split_deposits(person_id, share_id, date, dry_run)
+    except IntegrityError:
+        db.session.rollback()
+        raise click.UsageError(f"The deposits of person {person_id} were already split at {date}")
+    if result is None:
+        raise click.UsageError(f"No person found with ID {person_id}")
+    person = Person.get(person_id)
 
-    db.session.commit()
+    if dry_run:
+        click.echo(
+            f"Would move {result.moved_deposits} deposits ({result.moved_amount}) to a new person."
+            f" The existing person {person.name} ({person.id})"
+            f" would deposit into account {share_name}"
+            f" and bring {result.remaining_deposits} deposits"
+            f" ({result.remaining_amount}) with them."
+        )
+        return
     click.echo(
-        f"Moved {len(deposits)} deposits to new person with ID {virtual_person.id}."
+        f"Moved {result.moved_deposits} deposits to new person with ID {result.virtual_person_id}."
         f" The existing person {person.name} ({person.id})"
-        f" now deposits into account {newly_assigned_share.name}"
-        f" and brought {moved_deposits} deposits with them."
+        f" now deposits into account {share_name}"
+        f" and brought {result.remaining_deposits} deposits with them."
     )
@@ -0,0 +1,78 @@
+"""
+Reads the payment overview with concurrent queries (see `CONCURRENT_READS`).
+The page of shares is read first. The aggregations over the deposits and bets of these
+shares are independent of each other, so one of them runs in a greenlet on a second
+connection from the pool while the other one runs on the request's session.
+Under gunicorn's gevent worker (see `gevent_wait_callback`) they overlap, elsewhere
+they run one after the other.
+"""
+
+from decimal import Decimal
+
+import gevent
+from sqlalchemy import func, select, text
+
+from solawi.app import db
+from solawi.models import DEPOSIT_TOTALS_QUERY, EXPECTED_AMOUNT_QUERY, Share, Station, paginate
+from solawi.read_models import _share_name
+
+# Postgres pushes the filter on the grouping column down into the aggregation
+PAGE_DEPOSIT_TOTALS_QUERY = f"""
+    select * from ({DEPOSIT_TOTALS_QUERY}) totals where share_id = any(:share_ids)
+"""
+PAGE_EXPECTED_AMOUNT_QUERY = f"""
+    select * from ({EXPECTED_AMOUNT_QUERY}) expected where share_id = any(:share_ids)
+"""
+
+
+def _fetch_all(engine, query, parameters):
+    with engine.connect() as connection:
+        return connection.execute(text(query), parameters).all()
+
+
+def payment_status_list(after=None, limit=None) -> list[dict]:
+    """
+    Returns the same dictionaries as `read_models.payment_status_list` but calculates
+    the totals from the deposits and bets instead of reading the snapshot.
+    """
+    shares = db.session.execute(
+        paginate(
+            select(
+                Share.id,
+                _share_name().label("name"),
+                Share.archived,
+                Share.note,
+                func.coalesce(Station.name, "").label("station_name"),
+            ).outerjoin(Station, Station.id == Share.station_id),
+            Share.id,
+            after,
+            limit,
+        )
+    ).all()
+    parameters = {"share_ids": [share.id for share in shares]}
+
+    deposits = gevent.spawn(_fetch_all, db.engine, PAGE_DEPOSIT_TOTALS_QUERY, parameters)
+    expected = db.session.execute(text(PAGE_EXPECTED_AMOUNT_QUERY), parameters)
+    expected = {row.share_id: row.expected_today for row in expected}
+    deposits = {row.share_id: row for row in deposits.get()}
+
+    result = []
+    for share in shares:
+        totals = deposits.get(share.id)
+        total_deposits = totals and totals.total_deposits or Decimal(0)
+        expected_today = expected.get(share.id) or Decimal(0)
+        result.append(
+            {
+                "id": share.id,
+                "name": share.name,
+                "total_deposits": total_deposits,
+                "number_of_deposits": totals.number_of_deposits if totals else 0,
+                "total_security": totals and totals.total_security or Decimal(0),
+                "archived": share.archived,
+                "note": share.note,
+                "station_name": share.station_name,
+                "expected_today": expected_today,
+                "difference_today": total_deposits - expected_today,
+            }
+        )
+    return result
@@ -1,25 +1,275 @@
+from datetime import timedelta
+from decimal import Decimal
+from typing import NamedTuple, Optional
+
+from sqlalchemy import (
+    Boolean,
+    DateTime,
+    Integer,
+    Text,
+    and_,
+    cast,
+    column,
+    delete,
+    func,
+    insert,
+    select,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
 from solawi.app import db
-from solawi.models import Share
+from solawi.models import Bet, Deposit, Member, PaymentStatus, Person, Share, TableRevision
 
 
 def without_nones(listlike):
     return [element for element in listlike if element is not None]
 
 
-def merge(first_share_id, second_share_id):
-    if not first_share_id or not second_share_id:
+def merge(first_share_id, *other_share_ids):
+    """
+    Moves the people, members and bets of all `other_share_ids` to the share
+    `first_share_id` and deletes the other shares. The rows are re-pointed with
+    one UPDATE per table so that the collections never need to be loaded.
+    The first share keeps its station unless it has none, the notes are joined.
+    Returns `None` without changing anything if one of the shares does not exist.
+    """
+    other_share_ids = [
+        share_id
+        for share_id in dict.fromkeys(without_nones(other_share_ids))
+        if share_id != first_share_id
+    ]
+    if not first_share_id or not other_share_ids:
+        return None
+
+    # lock all shares (in a consistent order) so that no rows are added to them while merging
+    rows = db.session.execute(
+        select(Share.id, Share.station_id, Share.note)
+        .where(Share.id.in_([first_share_id, *other_share_ids]))
+        .order_by(Share.id)
+        .with_for_update()
+    )
+    shares = {row.id: row for row in rows}
+    if len(shares) != len(other_share_ids) + 1:
+        db.session.rollback()
+        return None
+    ordered = [shares[share_id] for share_id in [first_share_id, *other_share_ids]]
+
+    for model in (Person, Member, Bet):
+        db.session.execute(
+            update(model)
+            .where(model.share_id.in_(other_share_ids))
+            .values(share_id=first_share_id)
+            .execution_options(synchronize_session=False)
+        )
+    db.session.execute(
+        update(Share)
+        .where(Share.id == first_share_id)
+        .values(
+            station_id=next(iter(without_nones(share.station_id for share in ordered)), None),
+            note=" \n --- \n ".join(without_nones(share.note for share in ordered)),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        delete(Share)
+        .where(Share.id.in_(other_share_ids))
+        .execution_options(synchronize_session=False)
+    )
+    # the bulk statements bypass the flush, so the snapshot is refreshed explicitly
+    PaymentStatus.refresh([first_share_id])
+    db.session.commit()
+    return first_share_id
+
+
+class SplitResult(NamedTuple):
+    person_id: int
+    # `None` for a dry run
+    virtual_person_id: Optional[int]
+    moved_deposits: int
+    moved_amount: Decimal
+    remaining_deposits: int
+    remaining_amount: Decimal
+
+
+def split_deposits(person_id, share_id, date, dry_run=False) -> Optional[SplitResult]:
+    """
+    Creates a new virtual person in the person's current share and moves all deposits
+    of the person made before `date` to it. The person is then assigned to `share_id`.
+    This is to be used in case a person switches their share but continues to deposit money.
+    With `dry_run` nothing is changed and only the counts and amounts are returned.
+    Raises an `IntegrityError` if the person was already split at the same date.
+    """
+    # the lock keeps new deposits of the person from being added while splitting
+    person = db.session.execute(
+        select(Person.id, Person.name, Person.share_id)
+        .where(Person.id == person_id)
+        .with_for_update()
+    ).one_or_none()
+    if person is None:
+        db.session.rollback()
         return None
 
-    first_share = Share.get(first_share_id)
-    second_share = Share.get(second_share_id)
+    is_moved = Deposit.timestamp < date
+    totals = db.session.execute(
+        select(
+            func.count(),
+            func.coalesce(func.sum(Deposit.amount), 0),
+            func.count().filter(is_moved),
+            func.coalesce(func.sum(Deposit.amount).filter(is_moved), 0),
+        ).where(Deposit.person_id == person_id)
+    ).one()
+    number_of_deposits, total_amount, moved_deposits, moved_amount = totals
+    result = SplitResult(
+        person_id=person.id,
+        virtual_person_id=None,
+        moved_deposits=moved_deposits,
+        moved_amount=moved_amount,
+        remaining_deposits=number_of_deposits - moved_deposits,
+        remaining_amount=total_amount - moved_amount,
+    )
+    if dry_run:
+        db.session.rollback()
+        return result
+
+    # the date keeps the name unique if the person switches their share more than once
+    virtual_person_id = db.session.scalar(
+        insert(Person)
+        .values(
+            name=f"{person.name} [alt bis {date} - vom Kontotool erstellt]",
+            share_id=person.share_id,
+        )
+        .returning(Person.id)
+    )
+    moved_ids = db.session.scalars(
+        update(Deposit)
+        .where(Deposit.person_id == person_id)
+        .where(is_moved)
+        .values(person_id=virtual_person_id)
+        .returning(Deposit.id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.session.execute(
+        update(Person)
+        .where(Person.id == person_id)
+        .values(share_id=share_id)
+        .execution_options(synchronize_session=False)
+    )
+    PaymentStatus.refresh([person.share_id, share_id])
+    db.session.commit()
+    return result._replace(virtual_person_id=virtual_person_id, moved_deposits=len(moved_ids))
+
+
+def add_deposits(deposits: list[dict], added_by) -> list[Optional[int]]:
+    """
+    Inserts all `deposits` with one statement and returns the id of every created
+    deposit in the order of `deposits`. Deposits that exist already (see the unique
+    indexes on `Deposit`) are skipped and `None` is returned for them.
+    """
+    fields = ["amount", "timestamp", "title", "person_id", "is_security", "ignore"]
+    rows = values(
+        column("position", Integer),
+        *(column(field) for field in fields),
+        name="rows",
+    ).data(
+        [
+            (position, *(deposit.get(field) for field in fields))
+            for position, deposit in enumerate(deposits)
+        ]
+    )
+    # the values are sent untyped, so they are cast to the types of the deposit columns;
+    # the amount is rounded like the stored one so that the inserted rows can be matched
+    given = select(
+        rows.c.position,
+        cast(rows.c.amount, Deposit.amount.type).label("amount"),
+        cast(rows.c.timestamp, DateTime).label("timestamp"),
+        cast(rows.c.title, Text).label("title"),
+        cast(rows.c.person_id, Integer).label("person_id"),
+        func.coalesce(cast(rows.c.is_security, Boolean), False).label("is_security"),
+        func.coalesce(cast(rows.c.ignore, Boolean), False).label("ignore"),
+    ).cte("given")
+    inserted = (
+        pg_insert(Deposit)
+        .from_select(
+            [*fields, "added_by"],
+            select(*(given.c[field] for field in fields), cast(added_by, Integer)).order_by(
+                given.c.position
+            ),
+        )
+        .on_conflict_do_nothing()
+        .returning(Deposit.id, Deposit.amount, Deposit.timestamp, Deposit.title, Deposit.person_id)
+        .cte("inserted")
+    )
+    result = db.session.execute(
+        select(given.c.position, given.c.person_id, inserted.c.id)
+        .outerjoin(
+            inserted,
+            and_(
+                inserted.c.amount == given.c.amount,
+                inserted.c.timestamp == given.c.timestamp,
+                inserted.c.title.is_not_distinct_from(given.c.title),
+                inserted.c.person_id == given.c.person_id,
+            ),
+        )
+        .order_by(given.c.position)
+    ).all()
+
+    ids, created, person_ids = [], set(), set()
+    for row in result:
+        # a deposit that is given twice is only inserted once
+        is_new = row.id is not None and row.id not in created
+        ids.append(row.id if is_new else None)
+        if is_new:
+            created.add(row.id)
+            person_ids.add(row.person_id)
+    if person_ids:
+        # the insert is nested in a select, so the session does not notice it
+        TableRevision.mark_changed([Deposit.__tablename__])
+        PaymentStatus.refresh_for_persons(person_ids)
+    db.session.commit()
+    return ids
+
 
-    first_share.people += list(second_share.people)
-    first_share.members += list(second_share.members)
-    first_share.bets += list(second_share.bets)
-    first_share.station_id = first_share.station_id or second_share.station_id
-    first_share.note = " \n --- \n ".join(without_nones([first_share.note, second_share.note]))
+def update_deposits(
+    changes: dict,
+    ids=None,
+    person_id=None,
+    share_id=None,
+    from_date=None,
+    to_date=None,
+    title_pattern=None,
+) -> list[int]:
+    """
+    Applies `changes` to all deposits that match every given filter with one UPDATE
+    and returns the ids of the updated deposits. `from_date` and `to_date` are
+    inclusive and `title_pattern` is matched case-insensitively with `ILIKE`.
+    """
+    conditions = []
+    if ids is not None:
+        conditions.append(Deposit.id.in_(ids))
+    if person_id is not None:
+        conditions.append(Deposit.person_id == person_id)
+    if share_id is not None:
+        conditions.append(
+            Deposit.person_id.in_(select(Person.id).where(Person.share_id == share_id))
+        )
+    if from_date is not None:
+        conditions.append(Deposit.timestamp >= from_date)
+    if to_date is not None:
+        conditions.append(Deposit.timestamp < to_date + timedelta(days=1))
+    if title_pattern is not None:
+        conditions.append(Deposit.title.ilike(title_pattern))
+    if not conditions:
+        raise ValueError("At least one filter is required")
 
-    db.session.add(first_share)
-    db.session.delete(second_share)
+    updated = db.session.execute(
+        update(Deposit)
+        .where(*conditions)
+        .values(changes)
+        .returning(Deposit.id, Deposit.person_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    PaymentStatus.refresh_for_persons(row.person_id for row in updated)
     db.session.commit()
-    return first_share.id
+    return sorted(row.id for row in updated)
@@ -0,0 +1,97 @@
+"""
+A Python port of the `get_expected_today` database function
+(see `migrations/sql/get_expected_today_3.sql`).
+
+It allows to answer "how much should this bet have paid by date X"
+for bets that are already loaded without a round trip to the database
+and to evaluate many bets at many dates in one call.
+The rules (including their quirks) have to stay in sync with the SQL
+function which is enforced by the parity tests in `test_expected.py`.
+"""
+
+from datetime import date
+from decimal import Decimal
+from typing import Iterable, Optional, Sequence
+
+# From this day of the month on, the payment for the next month is due
+NEW_PAYMENT_REQUIRED_DAY = 27
+# Bets that start on or after this day of the month only pay for half of the first month
+MID_MONTH_DAY = 15
+
+
+def _as_decimal(amount) -> Decimal:
+    if isinstance(amount, Decimal):
+        return amount
+    # Going through `str` avoids binary float artifacts (e.g. for `97.17`)
+    return Decimal(str(amount))
+
+
+def _half_months_due(start_date: date, end_date: Optional[date], today: date) -> int:
+    """
+    Returns the number of *half* months that are due for a bet at `today`.
+    Working with half months keeps all intermediate values integers.
+    """
+    bet_end = today if end_date is None else min(end_date, today)
+    months = max((bet_end.year - start_date.year) * 12 + bet_end.month - start_date.month, 0)
+
+    if bet_end.day >= NEW_PAYMENT_REQUIRED_DAY:
+        months += 1
+
+    if today > start_date and end_date is None:
+        # if this bet is still active, we expect them to have payed
+        # for the following month already
+        months += 1
+
+    half_months = months * 2
+    if start_date.day >= MID_MONTH_DAY:
+        # If the Bet was started at mid-month, subtract half
+        # a month from the expected amount
+        half_months -= 1
+
+        if bet_end.day - start_date.day > 16:
+            # If the Bet started at a half month and today is a new
+            # month (but no full month in the delta yet), we need to
+            # account for one more month.
+            half_months += 2
+    return half_months
+
+
+def expected_amount(
+    start_date: date, end_date: Optional[date], amount, today: Optional[date] = None
+) -> Decimal:
+    """
+    Returns the amount that a bet should have paid by `today` (defaults to the current date).
+    """
+    today = today or date.today()
+    return _as_decimal(amount) * _half_months_due(start_date, end_date, today) / 2
+
+
+def expected_amounts(bets: Iterable, dates: Sequence[date]) -> list[list[Decimal]]:
+    """
+    Evaluates many bets at many dates in one call.
+    `bets` can be `Bet` instances or any objects/rows with `start_date`,
+    `end_date` and `value` attributes.
+
+    returns a list with one entry per bet which holds the expected
+    amount for every date in `dates` (in the same order).
+    """
+    result = []
+    for bet in bets:
+        value = _as_decimal(bet.value)
+        start_date = bet.start_date
+        end_date = bet.end_date
+        result.append(
+            [value * _half_months_due(start_date, end_date, today) / 2 for today in dates]
+        )
+    return result
+
+
+def total_expected_amounts(bets: Iterable, dates: Sequence[date]) -> list[Decimal]:
+    """
+    Like `expected_amounts` but sums up the amounts of all bets per date.
+    This is what a share is expected to have paid at each of the dates.
+    """
+    totals = [Decimal(0)] * len(dates)
+    for amounts in expected_amounts(bets, dates):
+        totals = [total + amount for total, amount in zip(totals, amounts)]
+    return totals
@@ -1,7 +1,7 @@
 import logging
 import os
 from decimal import Decimal
-from typing import Optional
+from typing import Iterable, NamedTuple, Optional
 
 from dateutil.relativedelta import relativedelta
 from fints.client import (
@@ -10,8 +10,18 @@ from fints.client import (
     NeedTANResponse,
 )
 from fints.utils import minimal_interactive_cli_bootstrap
+from sqlalchemy import or_, select, update
+from sqlalchemy.dialects.postgresql import insert
 
-from solawi.models import Deposit, Member, Person, Share
+from solawi.app import db
+from solawi.models import Deposit, Member, PaymentStatus, Person, Share
+
+BATCH_SIZE = 500
+
+
+class ImportResult(NamedTuple):
+    inserted: int
+    skipped: int
 
 
 def clean_title(title: Optional[str]):
@@ -54,9 +64,8 @@ def import_fin_ts(is_interactive):
 
         print("No more challenges to complete")
 
-        for transaction in res:
-            save_transaction(transaction)
-        print(f"Imported {len(res)} transactions")
+        result = save_transactions(res)
+        print(f"Imported {result.inserted} transactions, skipped {result.skipped} duplicates")
         if is_interactive:
             print("Press Enter to close the window")
             input()
@@ -75,21 +84,118 @@ def get_new_transactions(f):
 
 
 def save_transaction(transaction):
-    title = transaction.data.get("purpose")
-    name = transaction.data.get("applicant_name")
-    date = transaction.data.get("date")
-    amount = transaction.data.get("amount")
-    value = Decimal(amount.amount)
-    if value > 0:
-        person = Person.get_or_create(name)
-        deposit = Deposit(amount=value, timestamp=date, person=person, title=clean_title(title))
-        deposit.save()
-
-        if person.share_id is None:
-            member = Member(name=name)
-            member.save()
-
-            share = Share()
-            share.people.append(person)
-            share.members.append(member)
-            share.save()
+    return save_transactions([transaction])
+
+
+def save_transactions(transactions: Iterable, batch_size=BATCH_SIZE) -> ImportResult:
+    """
+    Saves the deposits for all incoming transactions. Transactions are processed
+    in batches: the applicant names of a batch are resolved in one go and the deposits
+    are inserted with a single statement that skips the ones that were imported already.
+    """
+    inserted = 0
+    skipped = 0
+    batch = []
+    for transaction in transactions:
+        batch.append(transaction)
+        if len(batch) >= batch_size:
+            result = _save_batch(batch)
+            inserted += result.inserted
+            skipped += result.skipped
+            batch = []
+    if batch:
+        result = _save_batch(batch)
+        inserted += result.inserted
+        skipped += result.skipped
+    return ImportResult(inserted=inserted, skipped=skipped)
+
+
+def _save_batch(transactions) -> ImportResult:
+    deposits = []
+    for transaction in transactions:
+        value = Decimal(transaction.data.get("amount").amount)
+        if value > 0:
+            deposits.append(
+                {
+                    "name": transaction.data.get("applicant_name"),
+                    "timestamp": transaction.data.get("date"),
+                    "amount": value,
+                    "title": clean_title(transaction.data.get("purpose")),
+                }
+            )
+    if not deposits:
+        return ImportResult(inserted=0, skipped=0)
+
+    persons = _get_or_create_persons({deposit["name"] for deposit in deposits})
+    _create_shares([person for person in persons.values() if person["share_id"] is None])
+
+    inserted = db.session.scalars(
+        insert(Deposit)
+        .values(
+            [
+                {
+                    "amount": deposit["amount"],
+                    "timestamp": deposit["timestamp"],
+                    "title": deposit["title"],
+                    "person_id": persons[deposit["name"]]["id"],
+                    "is_security": False,
+                    "ignore": False,
+                }
+                for deposit in deposits
+            ]
+        )
+        .on_conflict_do_nothing()
+        .returning(Deposit.id)
+    ).all()
+
+    PaymentStatus.refresh_for_persons(person["id"] for person in persons.values())
+    db.session.commit()
+    return ImportResult(inserted=len(inserted), skipped=len(deposits) - len(inserted))
+
+
+def _get_or_create_persons(names) -> dict[str, dict]:
+    """
+    returns a dictionary from name to the `id` and `share_id` of the person with
+    this name. Persons that do not exist yet are created.
+    """
+    columns = (Person.id, Person.name, Person.share_id)
+    condition = Person.name.in_([name for name in names if name is not None])
+    if None in names:
+        # transactions without an applicant name all belong to the same (first) person
+        condition = or_(condition, Person.name.is_(None))
+    existing = db.session.execute(select(*columns).where(condition).order_by(Person.id))
+    persons = {}
+    for row in existing:
+        persons.setdefault(row.name, row._asdict())
+
+    missing = [{"name": name} for name in names if name not in persons]
+    if missing:
+        created = db.session.execute(
+            insert(Person).values(missing).on_conflict_do_nothing().returning(*columns)
+        )
+        persons.update({row.name: row._asdict() for row in created})
+    return persons
+
+
+def _create_shares(persons):
+    """
+    Creates a new share with one member for every person. This is done for
+    persons that were not assigned to a share yet.
+    """
+    if not persons:
+        return
+    share_ids = db.session.scalars(
+        insert(Share).returning(Share.id, sort_by_parameter_order=True),
+        [{"archived": False} for _ in persons],
+    ).all()
+    assignments = list(zip(persons, share_ids))
+    db.session.execute(
+        insert(Member),
+        [{"name": person["name"], "share_id": share_id} for person, share_id in assignments],
+    )
+    db.session.execute(
+        update(Person),
+        [{"id": person["id"], "share_id": share_id} for person, share_id in assignments],
+    )
+    for person, share_id in assignments:
+        person["share_id"] = share_id
@@ -1,17 +1,89 @@
 import datetime
 from datetime import date
 from decimal import Decimal
+from itertools import chain
+from operator import attrgetter
+from typing import Iterator
 
-from sqlalchemy import Index, func, text
+from sqlalchemy import Index, event, func, inspect, select, text
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import class_mapper
 from sqlalchemy.orm.exc import NoResultFound
 
 from solawi.app import app, bcrypt, db
+from solawi.expected import expected_amount, total_expected_amounts
+
+# Aggregations per share that are shared between the overview and the detail queries.
+DEPOSIT_TOTALS_QUERY = """
+    select person.share_id,
+           sum(amount) filter (where not deposit.is_security) as total_deposits,
+           sum(amount) filter (where deposit.is_security) as total_security,
+           count(*) as number_of_deposits
+    from deposit
+    join person on person.id = deposit.person_id
+    where not deposit.ignore
+    group by person.share_id
+"""
+
+EXPECTED_AMOUNT_QUERY = """
+    select share_id,
+           sum(
+             get_expected_at(bet.start_date::date,
+                             bet.end_date::date,
+                             bet.value,
+                             current_date
+                            )
+           ) as expected_today
+    from bet
+    group by share_id
+"""
+
+# The payment details for all shares in `:share_ids` (or all shares if `:share_ids` is null).
+# The filter is repeated in the join conditions so that Postgres can push it down into
+# the aggregations instead of aggregating over all deposits and bets.
+PAYMENT_STATUS_QUERY = f"""
+    select share.id as share_id,
+           coalesce(deposits.total_deposits, 0) as total_deposits,
+           coalesce(deposits.total_security, 0) as total_security,
+           coalesce(deposits.number_of_deposits, 0) as number_of_deposits,
+           coalesce(expected.expected_today, 0) as expected_today
+    from share
+    left join ({DEPOSIT_TOTALS_QUERY}) deposits
+           on deposits.share_id = share.id
+          and (cast(:share_ids as integer[]) is null or deposits.share_id = any(:share_ids))
+    left join ({EXPECTED_AMOUNT_QUERY}) expected
+           on expected.share_id = share.id
+          and (cast(:share_ids as integer[]) is null or expected.share_id = any(:share_ids))
+    where (cast(:share_ids as integer[]) is null or share.id = any(:share_ids))
+"""
+
+# The number of rows that are fetched at once when streaming large results.
+STREAM_BATCH_SIZE = 500
+
+
+def paginate(query, id_column, after=None, limit=None):
+    """
+    Applies keyset pagination to `query`: only rows after the id `after` are returned,
+    ordered by `id_column`. One row more than `limit` is fetched so that the caller can
+    tell whether there is another page.
+    """
+    if after is not None:
+        query = query.where(id_column > after)
+    query = query.order_by(id_column)
+    if limit is not None:
+        query = query.limit(limit + 1)
+    return query
 
 
 class BaseModel:
+    # The columns that `json` returns. They are set for every model by
+    # `_compile_serializers` once all models are defined.
+    _json_columns: tuple = ()
+    _json_fields: tuple[str, ...] = ()
+    _json_getter = None
+
     def save(self):
         try:
             db.session.add(self)
@@ -35,12 +107,19 @@ class BaseModel:
 
     @property
     def json(self):
-        d = {}
-        columns = class_mapper(self.__class__).columns
-        for c in columns:
-            name = c.name
-            d[name] = getattr(self, name)
-        return d
+        return dict(zip(self._json_fields, self._json_getter(self)))
+
+    @classmethod
+    def json_columns(cls) -> tuple:
+        """
+        The columns to select in order to serialize the resulting rows with
+        `json_from_row` without loading the model instances.
+        """
+        return cls._json_columns
+
+    @classmethod
+    def json_from_row(cls, row) -> dict:
+        return dict(zip(cls._json_fields, row))
 
 
 class Member(db.Model, BaseModel):
@@ -48,18 +127,53 @@ class Member(db.Model, BaseModel):
     phone = db.Column(db.String)
     name = db.Column(db.String)
     email = db.Column(db.String)
-    share_id = db.Column(db.Integer, db.ForeignKey("share.id"))
+    share_id = db.Column(db.Integer, db.ForeignKey("share.id"), index=True)
+
+    @staticmethod
+    def get_list(active_only=False, after=None, limit=None) -> Iterator[dict]:
+        """
+        Yields all members together with the station name and the join date of their
+        share. Both are computed in the same query so that the shares' bets and
+        stations do not have to be loaded one share at a time.
+        """
+        join_date = (
+            select(func.min(Bet.start_date)).where(Bet.share_id == Member.share_id)
+        ).scalar_subquery()
+        query = (
+            select(
+                *Member.json_columns(),
+                Station.name.label("station_name"),
+                join_date.label("join_date"),
+            )
+            .outerjoin(Share, Share.id == Member.share_id)
+            .outerjoin(Station, Station.id == Share.station_id)
+        )
+        if active_only:
+            query = query.where(
+                select(Bet.id)
+                .where(Bet.share_id == Member.share_id)
+                .where(Bet.end_date.is_(None) | (Bet.end_date > datetime.date.today()))
+                .exists()
+            )
+        query = paginate(query, Member.id, after, limit)
+
+        for row in db.session.execute(query.execution_options(yield_per=STREAM_BATCH_SIZE)):
+            member = row._asdict()
+            if member["share_id"] is None:
+                member["station_name"] = ""
+                member["join_date"] = ""
+            yield member
 
 
 class Deposit(db.Model, BaseModel):
     id = db.Column(db.Integer, primary_key=True)  # pylint: disable=invalid-name
-    amount = db.Column(db.Numeric)
+    amount = db.Column(db.Numeric(10, 2))
     # TODO: Convert to Date and rename to `date`
     timestamp = db.Column(db.DateTime)
     is_security = db.Column(db.Boolean, nullable=False, default=False)
     title = db.Column(db.Text)
     ignore = db.Column(db.Boolean, nullable=False, default=False)
-    added_by = db.Column(db.Integer, db.ForeignKey("user.id"))
+    added_by = db.Column(db.Integer, db.ForeignKey("user.id"), index=True)
 
     person_id = db.Column(db.Integer, db.ForeignKey("person.id"))
 
@@ -81,6 +195,18 @@ class Deposit(db.Model, BaseModel):
             unique=True,
             postgresql_where=(title.is_(None)),
         ),
+        # covers the aggregations per person (see `DEPOSIT_TOTALS_QUERY`)
+        Index(
+            "ix_deposit_person_id",
+            "person_id",
+            postgresql_include=["amount", "is_security", "ignore"],
+        ),
+        # for `latest_import`
+        Index(
+            "ix_deposit_imported_timestamp",
+            "timestamp",
+            postgresql_where=(added_by.is_(None)),
+        ),
     )
 
     def __repr__(self):
@@ -100,45 +226,18 @@ class Bet(db.Model, BaseModel):
     value = db.Column(db.Numeric, nullable=False)
     start_date: date = db.Column(db.Date, nullable=False)
     end_date: date = db.Column(db.Date)
-    share_id = db.Column(db.Integer, db.ForeignKey("share.id"), nullable=False)
+    share_id = db.Column(db.Integer, db.ForeignKey("share.id"), nullable=False, index=True)
 
     @property
     def currently_active(self):
         return (not self.end_date) or (self.end_date > datetime.date.today())
 
     def expected_at(self, date):
-        with db.engine.connect() as connection:
-            return connection.execute(
-                text(
-                    """
-              SELECT get_expected_today(bet.start_date,
-                                        bet.end_date,
-                                        bet.value,
-                                        :date
-                                       )
-              from bet
-              where bet.id = :id
-              """
-                ),
-                {"date": date, "id": self.id},
-            ).scalar()
+        return expected_amount(self.start_date, self.end_date, self.value, date)
 
     @property
     def expected_today(self):
-        with db.engine.connect() as connection:
-            return connection.execute(
-                text(
-                    """
-              SELECT get_expected_today(bet.start_date,
-                                        bet.end_date,
-                                        bet.value
-                                       )
-              from bet
-              where bet.id = :id
-              """
-                ),
-                {"id": self.id},
-            ).scalar()
+        return expected_amount(self.start_date, self.end_date, self.value)
 
 
 class Share(db.Model, BaseModel):
@@ -172,35 +271,31 @@ class Share(db.Model, BaseModel):
         return min(start_dates) if start_dates else None
 
     @staticmethod
-    def get_deposits(share_id):
-        res = (
+    def get_deposits(share_id, after=None, limit=None) -> Iterator[dict]:
+        query = (
             db.session.query(Deposit, Person.name, Person.id, User.email)
             .join(Person)
             .outerjoin(User, User.id == Deposit.added_by)
             .filter(Person.share_id == share_id)
-            .all()
         )
-        result = []
+        res = paginate(query, Deposit.id, after, limit).yield_per(STREAM_BATCH_SIZE)
         for deposit, person_name, person_id, adder_email in res:
-            result.append(
-                dict(
-                    id=deposit.id,
-                    timestamp=deposit.timestamp,
-                    amount=deposit.amount,
-                    title=deposit.title,
-                    added_by_email=adder_email,
-                    person_id=person_id,
-                    person_name=person_name,
-                    ignore=deposit.ignore,
-                    is_security=deposit.is_security,
-                )
+            yield dict(
+                id=deposit.id,
+                timestamp=deposit.timestamp,
+                amount=deposit.amount,
+                title=deposit.title,
+                added_by_email=adder_email,
+                person_id=person_id,
+                person_name=person_name,
+                ignore=deposit.ignore,
+                is_security=deposit.is_security,
             )
-        return result
 
     @staticmethod
     def get_bets(share_id):
-        res = db.session.query(Bet).filter(Bet.share_id == share_id).all()
-        return [bet.json for bet in res]
+        res = db.session.execute(select(*Bet.json_columns()).where(Bet.share_id == share_id))
+        return [Bet.json_from_row(row) for row in res]
 
     @property
     def deposits(self):
@@ -227,83 +322,128 @@ class Share(db.Model, BaseModel):
 
     @property
     def expected_today(self):
-        return sum(bet.expected_today for bet in self.bets)
+        return self.expected_at(datetime.date.today())
+
+    def expected_at(self, date):
+        (expected,) = total_expected_amounts(self.bets, [date])
+        return expected
 
     @property
     def currently_active(self):
         return any([bet.currently_active for bet in self.bets])
 
     @staticmethod
-    def get_deposit_map() -> dict[int, dict[str, str]]:
+    def get_payment_summary(share_id) -> dict[str, Decimal]:
         """
-        returns a dictionary in the form
+        returns the totals of a single share, calculated with the same
+        query as the `PaymentStatus` snapshot:
         ```
         {
-          <share_id>: {
-           "total_deposits": <decimal>
-           "total_security": <decimal>
-           "number_of_deposits": <decimal>
-          }
+          "total_deposits": <decimal>
+          "total_security": <decimal>
+          "number_of_deposits": <int>
+          "expected_today": <decimal>
         }
         ```
-
-        The goal of this method is to push these aggregations
-        to the database to reduce the amount of data that gets
-        transferred between database and client in order to speed
-        up the overall performance of the API.
         """
-        with db.engine.connect() as connection:
-            result = connection.execute(
-                text(
-                    """
-            select person.share_id,
-                   sum(amount) filter (where not deposit.is_security) as total_deposits,
-                   sum(amount) filter (where deposit.is_security) as total_security,
-                   count(*) as number_of_deposits
-            from deposit
-            join person on person.id = deposit.person_id
-            where not deposit.ignore
-            group by person.share_id
-    """
-                )
-            )
-            return {
-                row.share_id: {
-                    "number_of_deposits": row.number_of_deposits,
-                    "total_deposits": row.total_deposits,
-                    "total_security": row.total_security,
-                }
-                for row in result
-            }
+        row = db.session.execute(text(PAYMENT_STATUS_QUERY), {"share_ids": [share_id]}).one()
+        return {key: value for key, value in row._asdict().items() if key != "share_id"}
 
     @staticmethod
-    def get_expected_amount_map() -> dict[int, (Decimal or None)]:
+    def get_timelines(share_id=None) -> dict[int, list[dict]]:
         """
         returns a dictionary in the form
         ```
         {
-          <share_id>: <decimal>
+          <share_id>: [
+            {
+              "month": <date>,
+              "expected": <decimal>,
+              "paid": <decimal>,
+              "difference": <decimal>,
+            },
+            ...
+          ]
         }
         ```
-        where the dictionary value is the amount of money that we
-        expect this share to have paid by today.
+        with one entry per month from the first bet or deposit of a share
+        until the current month. `expected` is what the share should have
+        paid by the end of the month (or by today for the current month) and
+        `paid` is the sum of all valid deposits up to the end of that month.
+        If `share_id` is passed, only the timeline for that share is calculated.
         """
-        with db.engine.connect() as connection:
-            result = connection.execute(
-                text(
-                    """
-            SELECT share_id,
-              SUM(
-                get_expected_today(bet.start_date::date,
-                                   bet.end_date::date,
-                                   bet.value
-                                   )
-              ) as expected_today from bet
-            group by share_id;
+        result = db.session.execute(
+            text(
+                """
+            with share_start as (
+                select share_id, min(start_date) as first_day
+                from (
+                    select bet.share_id, bet.start_date
+                    from bet
+                    union all
+                    select person.share_id, deposit.timestamp::date
+                    from deposit
+                    join person on person.id = deposit.person_id
+                ) starts
+                where share_id is not null
+                  and (cast(:share_id as integer) is null or share_id = :share_id)
+                group by share_id
+            ),
+            months as (
+                select share_start.share_id,
+                       month::date as month,
+                       least((month + interval '1 month - 1 day')::date, current_date) as cutoff
+                from share_start,
+                     generate_series(date_trunc('month', share_start.first_day),
+                                     date_trunc('month', current_date),
+                                     interval '1 month') as month
+            ),
+            expected as (
+                select months.share_id,
+                       months.month,
+                       coalesce(sum(get_expected_at(bet.start_date,
+                                                    bet.end_date,
+                                                    bet.value,
+                                                    months.cutoff)), 0) as expected
+                from months
+                left join bet on bet.share_id = months.share_id
+                group by months.share_id, months.month
+            ),
+            paid_per_month as (
+                select person.share_id,
+                       date_trunc('month', deposit.timestamp)::date as month,
+                       sum(deposit.amount) as paid
+                from deposit
+                join person on person.id = deposit.person_id
+                where not deposit.ignore
+                  and not deposit.is_security
+                  and (cast(:share_id as integer) is null or person.share_id = :share_id)
+                group by 1, 2
+            )
+            select expected.share_id,
+                   expected.month,
+                   expected.expected,
+                   sum(coalesce(paid_per_month.paid, 0)) over (
+                       partition by expected.share_id order by expected.month
+                   ) as paid
+            from expected
+            left join paid_per_month using (share_id, month)
+            order by expected.share_id, expected.month
             """
-                )
+            ),
+            {"share_id": share_id},
+        )
+        timelines = {}
+        for row in result:
+            timelines.setdefault(row.share_id, []).append(
+                {
+                    "month": row.month,
+                    "expected": row.expected,
+                    "paid": row.paid,
+                    "difference": row.paid - row.expected,
+                }
             )
-            return {row.share_id: row.expected_today for row in result}
+        return timelines
 
 
 class Station(db.Model, BaseModel):
@@ -319,7 +459,7 @@ class Station(db.Model, BaseModel):
 class Person(db.Model, BaseModel):
     id = db.Column(db.Integer, primary_key=True)  # pylint: disable=invalid-name
     name = db.Column(db.String(120), unique=True)
-    share_id = db.Column(db.Integer, db.ForeignKey("share.id"))
+    share_id = db.Column(db.Integer, db.ForeignKey("share.id"), index=True)
     deposits = db.relationship("Deposit", backref="person")
 
     def __repr__(self):
@@ -385,3 +525,238 @@ class User(db.Model, BaseModel):
             return user
         else:
             return None
+
+
+class TokenRevocation(db.Model, BaseModel):
+    """
+    All access tokens of a user that were issued before `revoked_at` are no longer valid.
+    """
+
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), primary_key=True)
+    revoked_at = db.Column(db.DateTime, nullable=False)
+
+    @staticmethod
+    def revoke(user_id, revoked_at):
+        db.session.execute(
+            insert(TokenRevocation)
+            .values(user_id=user_id, revoked_at=revoked_at)
+            .on_conflict_do_update(
+                index_elements=[TokenRevocation.user_id], set_={"revoked_at": revoked_at}
+            )
+        )
+        db.session.commit()
+
+    @staticmethod
+    def get_revoked_since(since) -> dict[int, datetime.datetime]:
+        rows = db.session.execute(
+            select(TokenRevocation.user_id, TokenRevocation.revoked_at).where(
+                TokenRevocation.revoked_at > since
+            )
+        )
+        return {row.user_id: row.revoked_at for row in rows}
+
+
+class PaymentStatus(db.Model, BaseModel):
+    """
+    A snapshot of `PAYMENT_STATUS_QUERY` per share so that the payment
+    overview does not need to aggregate over all deposits and bets.
+    It is kept up to date on every write that touches deposits, bets or
+    persons (see `_refresh_payment_status`) and `expected_today` is rolled
+    forward for rows that were not calculated today.
+    """
+
+    share_id = db.Column(
+        db.Integer, db.ForeignKey("share.id", ondelete="CASCADE"), primary_key=True
+    )
+    total_deposits = db.Column(db.Numeric, nullable=False, default=0)
+    total_security = db.Column(db.Numeric, nullable=False, default=0)
+    number_of_deposits = db.Column(db.Integer, nullable=False, default=0)
+    expected_today = db.Column(db.Numeric, nullable=False, default=0)
+    calculated_on = db.Column(db.Date, nullable=False)
+
+    @staticmethod
+    def refresh(share_ids=None, connection=None):
+        """
+        Recalculates the snapshot for the given shares or for all shares if
+        `share_ids` is `None`. This runs in the current transaction.
+        """
+        if share_ids is not None:
+            share_ids = sorted(share_id for share_id in share_ids if share_id is not None)
+            if not share_ids:
+                return
+        connection = connection or db.session
+        # Concurrent writers to the same share wait here until the other one has committed,
+        # so that the aggregate (a new statement with a new snapshot) includes its rows.
+        # The shares are locked rather than their snapshots, which may not exist yet.
+        locked = select(Share.id).order_by(Share.id).with_for_update(key_share=True)
+        if share_ids is not None:
+            locked = locked.where(Share.id.in_(share_ids))
+        connection.execute(locked)
+        connection.execute(
+            text(
+                f"""
+            insert into payment_status (share_id,
+                                        total_deposits,
+                                        total_security,
+                                        number_of_deposits,
+                                        expected_today,
+                                        calculated_on)
+            select payments.*, current_date
+            from ({PAYMENT_STATUS_QUERY}) payments
+            on conflict (share_id) do update
+                set total_deposits = excluded.total_deposits,
+                    total_security = excluded.total_security,
+                    number_of_deposits = excluded.number_of_deposits,
+                    expected_today = excluded.expected_today,
+                    calculated_on = excluded.calculated_on
+            """
+            ),
+            {"share_ids": share_ids},
+        )
+
+    @staticmethod
+    def refresh_for_persons(person_ids, connection=None):
+        """
+        Recalculates the snapshot for the shares of the given persons. Bulk statements
+        bypass the flush and with it `_refresh_payment_status`, so code that writes
+        deposits with them calls this before committing.
+        """
+        person_ids = {person_id for person_id in person_ids if person_id is not None}
+        if not person_ids:
+            return
+        connection = connection or db.session
+        PaymentStatus.refresh(
+            connection.scalars(select(Person.share_id).where(Person.id.in_(person_ids))).all(),
+            connection=connection,
+        )
+
+    @staticmethod
+    def refresh_outdated():
+        """
+        Recalculates the snapshot for shares that have not been calculated
+        today. This is usually a no-op as the nightly `refresh-payment-status`
+        job rolls all rows forward.
+        """
+        outdated = db.session.scalars(
+            select(Share.id)
+            .outerjoin(PaymentStatus)
+            .where(PaymentStatus.calculated_on.is_distinct_from(func.current_date()))
+        ).all()
+        if outdated:
+            PaymentStatus.refresh(outdated)
+            db.session.commit()
+
+
+def _changed_values(instance, attribute):
+    history = inspect(instance).attrs[attribute].history
+    return [value for value in chain(history.added, history.unchanged, history.deleted)]
+
+
+@event.listens_for(db.session, "after_flush")
+def _refresh_payment_status(session, flush_context):
+    share_ids = set()
+    person_ids = set()
+    for instance in chain(session.new, session.dirty, session.deleted):
+        if isinstance(instance, Deposit):
+            person_ids.update(_changed_values(instance, "person_id"))
+        elif isinstance(instance, (Bet, Person)):
+            share_ids.update(_changed_values(instance, "share_id"))
+        elif isinstance(instance, Share) and instance in session.new:
+            share_ids.add(instance.id)
+
+    connection = session.connection()
+    PaymentStatus.refresh_for_persons(person_ids, connection=connection)
+    PaymentStatus.refresh(share_ids, connection=connection)
+
+
+class TableRevision(db.Model, BaseModel):
+    """
+    A counter per table that is incremented in the same transaction as every write to
+    the table (see `_bump_table_revisions`). The list endpoints derive their ETags from
+    it so that unchanged data can be detected without querying the tables themselves.
+    """
+
+    table_name = db.Column(db.String, primary_key=True)
+    revision = db.Column(db.BigInteger, nullable=False, default=0)
+
+    @staticmethod
+    def mark_changed(table_names, session=None):
+        """
+        Remembers that `table_names` were written to in the current transaction.
+        Their revisions are bumped once when the transaction is committed.
+        """
+        session = session or db.session
+        session.info.setdefault("changed_tables", set()).update(table_names)
+
+    @staticmethod
+    def bump(table_names, connection=None):
+        # sorted so that concurrent transactions lock the rows in the same order
+        table_names = sorted(set(table_names) - {TableRevision.__tablename__})
+        if not table_names:
+            return
+        connection = connection or db.session
+        connection.execute(
+            insert(TableRevision)
+            .values([{"table_name": table_name, "revision": 1} for table_name in table_names])
+            .on_conflict_do_update(
+                index_elements=[TableRevision.table_name],
+                set_={"revision": TableRevision.revision + 1},
+            )
+        )
+
+    @staticmethod
+    def get_revisions(table_names) -> dict[str, int]:
+        rows = db.session.execute(
+            select(TableRevision.table_name, TableRevision.revision).where(
+                TableRevision.table_name.in_(table_names)
+            )
+        )
+        return {row.table_name: row.revision for row in rows}
+
+
+@event.listens_for(db.session, "after_flush")
+def _collect_flushed_tables(session, flush_context):
+    TableRevision.mark_changed(
+        {
+            instance.__table__.name
+            for instance in chain(session.new, session.dirty, session.deleted)
+        },
+        session,
+    )
+
+
+@event.listens_for(db.session, "do_orm_execute")
+def _collect_executed_tables(orm_execute_state):
+    # bulk statements like `insert(Deposit)` do not go through the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        TableRevision.mark_changed(
+            [orm_execute_state.statement.table.name], orm_execute_state.session
+        )
+
+
+@event.listens_for(db.session, "before_commit")
+def _bump_table_revisions(session):
+    # The revision rows are only locked right before the commit and all at once (in the
+    # same order for every transaction) so that writers do not deadlock on them.
+    session.flush()
+    table_names = session.info.pop("changed_tables", set())
+    if table_names:
+        TableRevision.bump(table_names, connection=session.connection())
+
+
+@event.listens_for(db.session, "after_rollback")
+def _forget_changed_tables(session):
+    session.info.pop("changed_tables", None)
+
+
+def _compile_serializers():
+    for model in BaseModel.__subclasses__():
+        columns = tuple(class_mapper(model).columns)
+        fields = tuple(column.name for column in columns)
+        model._json_columns = columns
+        model._json_fields = fields
+        # all models have more than one column, so this always returns a tuple
+        model._json_getter = attrgetter(*fields)
+
+
+_compile_serializers()
@@ -0,0 +1,99 @@
+"""
+Read models build the payloads of the list endpoints from plain `select()` statements.
+Postgres aggregates the member names and bets per share so that the rows can be
+returned as they are, without loading ORM instances into the session.
+"""
+
+from datetime import date
+from decimal import Decimal
+from typing import Iterator
+
+from sqlalchemy import Text, cast, func, literal, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+
+from solawi.app import db
+from solawi.models import STREAM_BATCH_SIZE, Bet, Member, PaymentStatus, Share, Station, paginate
+
+
+def _share_name():
+    """
+    The names of the share's members joined with ` & `, the same as `Share.name`.
+    The names are sorted by code point ("C" collation) like Python's `sorted`.
+    """
+    name = func.string_agg(
+        Member.name, aggregate_order_by(literal(" & "), Member.name.collate("C"))
+    )
+    return (
+        select(func.coalesce(name, ""))
+        .where(Member.share_id == Share.id)
+        .where(Member.name != "")
+        .scalar_subquery()
+    )
+
+
+def _share_bets():
+    bet = func.json_build_object(
+        "id",
+        Bet.id,
+        # numerics are passed as text so that they can be read back as `Decimal`
+        "value",
+        cast(Bet.value, Text),
+        "start_date",
+        Bet.start_date,
+        "end_date",
+        Bet.end_date,
+        "share_id",
+        Bet.share_id,
+    )
+    return (
+        select(func.coalesce(func.json_agg(aggregate_order_by(bet, Bet.id)), "[]"))
+        .where(Bet.share_id == Share.id)
+        .scalar_subquery()
+    )
+
+
+def _execute(query, after, limit):
+    query = paginate(query, Share.id, after, limit)
+    return db.session.execute(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+
+
+def share_list(after=None, limit=None) -> Iterator[dict]:
+    """Yields the same dictionaries as `Share.json` for every share."""
+    query = select(
+        Share.id,
+        _share_name().label("name"),
+        Share.archived,
+        _share_bets().label("bets"),
+        Share.station_id,
+        Share.note,
+    )
+    for row in _execute(query, after, limit):
+        share = row._asdict()
+        for bet in share["bets"]:
+            bet["value"] = Decimal(bet["value"])
+            bet["start_date"] = date.fromisoformat(bet["start_date"])
+            if bet["end_date"]:
+                bet["end_date"] = date.fromisoformat(bet["end_date"])
+        yield share
+
+
+def payment_status_list(after=None, limit=None) -> Iterator[dict]:
+    """Yields the payment status of every share as shown in the payment overview."""
+    query = (
+        select(
+            Share.id,
+            _share_name().label("name"),
+            PaymentStatus.total_deposits,
+            PaymentStatus.number_of_deposits,
+            PaymentStatus.total_security,
+            Share.archived,
+            Share.note,
+            func.coalesce(Station.name, "").label("station_name"),
+            PaymentStatus.expected_today,
+            (PaymentStatus.total_deposits - PaymentStatus.expected_today).label("difference_today"),
+        )
+        .join(PaymentStatus, PaymentStatus.share_id == Share.id)
+        .outerjoin(Station, Station.id == Share.station_id)
+    )
+    for row in _execute(query, after, limit):
+        yield row._asdict()
@@ -0,0 +1,130 @@
+"""
+Readers for statement files that were exported from the bank (MT940 and CAMT.053).
+They yield transactions in the same shape as the FinTS client so that they can be
+passed to `save_transactions`. Both readers stream the file so that even exports that
+span multiple years can be imported in constant memory.
+"""
+
+from typing import Iterator, Optional
+from xml.etree import ElementTree
+
+from fints.utils import mt940_to_array
+from mt940.models import Amount, Date, Transaction
+
+MT940 = "mt940"
+CAMT053 = "camt053"
+
+
+def guess_format(path: str) -> str:
+    return CAMT053 if path.lower().endswith(".xml") else MT940
+
+
+def read_statement_file(path: str, file_format: Optional[str] = None, encoding="utf-8"):
+    file_format = file_format or guess_format(path)
+    if file_format == CAMT053:
+        return read_camt053(path)
+    return read_mt940(path, encoding)
+
+
+def read_mt940(path: str, encoding="utf-8") -> Iterator[Transaction]:
+    """
+    Reads the file statement by statement (every statement starts with a `:20:` tag)
+    and only hands a single statement at a time to the MT940 parser.
+    """
+    with open(path, encoding=encoding) as statement_file:
+        statement = []
+        for line in statement_file:
+            if line.startswith(":20:") and statement:
+                yield from mt940_to_array("".join(statement))
+                statement = []
+            statement.append(line)
+        if statement:
+            yield from mt940_to_array("".join(statement))
+
+
+def read_camt053(path: str) -> Iterator[Transaction]:
+    """
+    Reads all entries (`Ntry`) of a CAMT.053 file. Every entry is removed from the
+    tree once it was read so that the document is never fully loaded into memory.
+    """
+    parents = []
+    for event, element in ElementTree.iterparse(path, events=("start", "end")):
+        if event == "start":
+            parents.append(element)
+            continue
+        parents.pop()
+        if _local_name(element.tag) == "Ntry":
+            yield from _camt_transactions(element)
+            if parents:
+                parents[-1].remove(element)
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _namespaced(element, path: str) -> str:
+    namespace = element.tag[: element.tag.index("}") + 1] if element.tag.startswith("{") else ""
+    return "/".join(namespace + part for part in path.split("/"))
+
+
+def _find(element, path: str):
+    return element.find(_namespaced(element, path))
+
+
+def _find_text(element, *paths) -> Optional[str]:
+    """Returns the text of the first of `paths` that exists below `element`."""
+    for path in paths:
+        found = _find(element, path)
+        if found is not None and found.text:
+            return found.text.strip()
+    return None
+
+
+def _transaction_amount(details):
+    amount = _find(details, "Amt")
+    return amount if amount is not None else _find(details, "AmtDtls/TxAmt/Amt")
+
+
+def _camt_transactions(entry) -> Iterator[Transaction]:
+    """
+    Yields a single transaction for the entry unless it was booked as a batch (e.g. a
+    collective credit or a direct debit collection). Then every transaction detail
+    (`TxDtls`) is yielded with its own amount and party.
+    """
+    details = entry.findall(_namespaced(entry, "NtryDtls/TxDtls"))
+    amounts = [_transaction_amount(transaction_details) for transaction_details in details]
+    if len(details) > 1 and all(amount is not None for amount in amounts):
+        for transaction_details, amount in zip(details, amounts):
+            yield _camt_transaction(entry, transaction_details, amount)
+    else:
+        yield _camt_transaction(entry, details[0] if details else None, _find(entry, "Amt"))
+
+
+def _camt_transaction(entry, details, amount_element) -> Transaction:
+    # the details of a batch may have their own indicator
+    indicator = _find_text(details, "CdtDbtInd") if details is not None else None
+    is_credit = (indicator or _find_text(entry, "CdtDbtInd")) == "CRDT"
+    # The other party of the transaction is the debtor for incoming money
+    party = "Dbtr" if is_credit else "Cdtr"
+    name, purpose = None, None
+    if details is not None:
+        name = _find_text(details, f"RltdPties/{party}/Nm", f"RltdPties/{party}/Pty/Nm")
+        purpose = _find_text(details, "RmtInf/Ustrd")
+    purpose = purpose or _find_text(entry, "AddtlNtryInf")
+    booking_date = _find_text(entry, "BookgDt/Dt", "BookgDt/DtTm", "ValDt/Dt")
+    year, month, day = (int(part) for part in booking_date[:10].split("-"))
+
+    amount = Amount(
+        amount_element.text.strip(), "C" if is_credit else "D", amount_element.get("Ccy")
+    )
+    return Transaction(
+        None,
+        data={
+            "amount": amount,
+            "currency": amount.currency,
+            "date": Date(year, month, day),
+            "applicant_name": name,
+            "purpose": purpose,
+        },
+    )
@@ -0,0 +1,58 @@
+import unittest
+
+import gevent
+import psycopg2
+
+from solawi.app import db_url, engine_options, gevent_wait_callback
+
+
+class EngineOptionsTest(unittest.TestCase):
+    def test_defaults(self):
+        self.assertEqual(
+            engine_options({}),
+            {
+                "pool_size": 5,
+                "max_overflow": 10,
+                "pool_timeout": 30,
+                "pool_recycle": 1800,
+                "pool_pre_ping": True,
+            },
+        )
+
+    def test_reads_environment(self):
+        options = engine_options(
+            {"DB_POOL_SIZE": "2", "DB_MAX_OVERFLOW": "0", "DB_POOL_PRE_PING": "False"}
+        )
+
+        self.assertEqual(options["pool_size"], 2)
+        self.assertEqual(options["max_overflow"], 0)
+        self.assertFalse(options["pool_pre_ping"])
+
+
+class GeventWaitCallbackTest(unittest.TestCase):
+    def test_queries_yield_to_other_greenlets(self):
+        psycopg2.extensions.set_wait_callback(gevent_wait_callback)
+        self.addCleanup(psycopg2.extensions.set_wait_callback, None)
+        events = []
+
+        def query():
+            connection = psycopg2.connect(db_url)
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("select pg_sleep(0.2), 1")
+                    events.append("query")
+                    return cursor.fetchone()[1]
+            finally:
+                connection.close()
+
+        def tick():
+            for _ in range(5):
+                events.append("tick")
+                gevent.sleep(0.01)
+
+        query_greenlet, tick_greenlet = gevent.spawn(query), gevent.spawn(tick)
+        gevent.joinall([query_greenlet, tick_greenlet])
+
+        self.assertEqual(query_greenlet.value, 1)
+        # the ticks ran while the query was waiting for the database
+        self.assertEqual(events, ["tick"] * 5 + ["query"])
@@ -1,11 +1,14 @@
 import datetime
+import os
 
 import pytest
 
-from solawi.commands import _split_deposits
-from solawi.models import Deposit, Person
-from test_factories import DepositFactory, PersonFactory, ShareFactory
+from solawi.app import app
+from solawi.commands import _split_deposits, deactivate_user, import_file, split_deposits
+from solawi.models import Deposit, PaymentStatus, Person, User
+from test_factories import DepositFactory, PersonFactory, ShareFactory, UserFactory
 from test_helpers import DBTest
+from test_statement_files import MT940_STATEMENTS, write_file
 
 
 class TestCommands(DBTest):
@@ -41,3 +44,65 @@ class TestCommands(DBTest):
         )
         # Newer deposits still belong to the original person
         self.assertEqual(Deposit.query.filter(Deposit.person_id == person.id).count(), 6)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_split_deposits_updates_payment_status(self):
+        share1 = ShareFactory.create()
+        share2 = ShareFactory.create()
+        person = PersonFactory.create(share=share1)
+        DepositFactory.create(amount=10, person=person, timestamp=datetime.date(2020, 1, 1))
+        DepositFactory.create(amount=20, person=person, timestamp=datetime.date(2020, 2, 1))
+        share1_id, share2_id = share1.id, share2.id
+
+        _split_deposits(person.id, share2_id, "2020-01-28")
+
+        self.assertEqual(PaymentStatus.get(share1_id).total_deposits, 10)
+        self.assertEqual(PaymentStatus.get(share2_id).total_deposits, 20)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_split_deposits_dry_run(self):
+        share1 = ShareFactory.create()
+        share2 = ShareFactory.create()
+        person = PersonFactory.create(share=share1, name="Jane")
+        for i in range(10):
+            DepositFactory.create(
+                amount=10,
+                person=person,
+                timestamp=datetime.date(2020, 1, 1) + datetime.timedelta(weeks=i),
+            )
+
+        result = app.test_cli_runner().invoke(
+            split_deposits, [str(person.id), str(share2.id), "2020-01-28", "--dry-run"]
+        )
+
+        self.assertEqual(
+            result.output,
+            f"Would move 4 deposits (40.00) to a new person. The existing person Jane ({person.id})"
+            " would deposit into account  and bring 6 deposits (60.00) with them.\n",
+        )
+        self.assertEqual(Person.query.count(), 1)
+        self.assertEqual(Person.get(person.id).share_id, share1.id)
+        self.assertEqual(Deposit.query.filter(Deposit.person_id == person.id).count(), 10)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_import_file(self):
+        path = write_file(MT940_STATEMENTS, ".sta")
+        self.addCleanup(os.remove, path)
+        runner = app.test_cli_runner()
+
+        result = runner.invoke(import_file, [path])
+        repeated_result = runner.invoke(import_file, [path])
+
+        self.assertEqual(result.output, "Imported 2 transactions, skipped 0 duplicates\n")
+        self.assertEqual(repeated_result.output, "Imported 0 transactions, skipped 2 duplicates\n")
+        self.assertEqual(Deposit.query.count(), 2)
+        self.assertEqual(Person.query.one().name, "Jane Doe")
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_deactivate_user(self):
+        user = UserFactory.create(email="user@example.org")
+
+        result = app.test_cli_runner().invoke(deactivate_user, ["user@example.org"])
+
+        self.assertEqual(result.output, "Deactivated user user@example.org\n")
+        self.assertFalse(User.get(user.id).active)
@@ -1,10 +1,17 @@
 import pytest
 
 from solawi.controller import merge
-from solawi.models import Bet, Member, Share
+from solawi.models import Bet, Member, PaymentStatus, Person, Share
 from test_helpers import DBTest
 
-from test_factories import BetFactory, MemberFactory, ShareFactory, StationFactory  # isort:skip
+from test_factories import (  # isort:skip
+    BetFactory,
+    DepositFactory,
+    MemberFactory,
+    PersonFactory,
+    ShareFactory,
+    StationFactory,
+)
 
 
 class TestController(DBTest):
@@ -129,3 +136,39 @@ class TestController(DBTest):
         merge(share1.id, share2.id)
 
         assert Share.query.one().note == ""
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_merge_many(self):
+        station = StationFactory.create()
+        share1 = ShareFactory.create(station=None, note="Note 1")
+        share2 = ShareFactory.create(station=None)
+        share3 = ShareFactory.create(station=station, note="Note 3")
+        for share in [share1, share2, share3]:
+            MemberFactory.create(share=share)
+            BetFactory.create(share=share)
+            PersonFactory.create(share=share)
+        share_ids = [share1.id, share2.id, share3.id]
+        station_id = station.id
+
+        assert merge(*share_ids) == share_ids[0]
+
+        updated_share = Share.query.one()
+        assert updated_share.id == share_ids[0]
+        assert updated_share.station_id == station_id
+        assert updated_share.note == "Note 1 \n --- \n Note 3"
+        assert Member.query.filter_by(share_id=share_ids[0]).count() == 3
+        assert Bet.query.filter_by(share_id=share_ids[0]).count() == 3
+        assert Person.query.filter_by(share_id=share_ids[0]).count() == 3
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_merge_refreshes_payment_status(self):
+        share1 = ShareFactory.create()
+        share2 = ShareFactory.create()
+        DepositFactory.create(person=PersonFactory.create(share=share1), amount=10)
+        DepositFactory.create(person=PersonFactory.create(share=share2), amount=20)
+        share1_id, share2_id = share1.id, share2.id
+
+        merge(share1_id, share2_id)
+
+        assert PaymentStatus.get(share1_id).total_deposits == 30
+        assert PaymentStatus.get(share2_id) is None
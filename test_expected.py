@@ -0,0 +1,113 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import text
+
+from solawi.app import db
+from solawi.expected import expected_amount, expected_amounts, total_expected_amounts
+from test_helpers import DBTest
+
+
+def _days(start, end, step=1):
+    day = start
+    while day <= end:
+        yield day
+        day += timedelta(days=step)
+
+
+def _start_dates():
+    # the first, the middle and the end of some months around a year boundary
+    for month_start in [date(2016, 2, 1), date(2018, 11, 1), date(2018, 12, 1), date(2019, 1, 1)]:
+        for day in [1, 2, 14, 15, 16, 26, 27, 28]:
+            yield month_start.replace(day=day)
+    yield date(2019, 1, 31)
+
+
+def _end_dates():
+    return [None, date(2018, 12, 31), date(2019, 1, 14), date(2019, 1, 31), date(2019, 6, 30)]
+
+
+def _today_dates():
+    return list(_days(date(2018, 10, 1), date(2019, 8, 31), step=3)) + [date(2016, 2, 29)]
+
+
+class ExpectedAmountTest(DBTest):
+    def test_full_months(self):
+        amount = expected_amount(date(2017, 1, 1), date(2017, 3, 31), 100, date(2018, 1, 1))
+        self.assertEqual(amount, 300)
+
+    def test_half_month(self):
+        amount = expected_amount(date(2017, 1, 15), None, 100, date(2017, 1, 17))
+        self.assertEqual(amount, 50)
+
+    def test_keeps_decimal_precision(self):
+        amount = expected_amount(date(2017, 1, 1), date(2017, 3, 31), 97.17, date(2018, 1, 1))
+        self.assertEqual(amount, Decimal("291.51"))
+
+    def test_batched(self):
+        class FakeBet:
+            def __init__(self, start_date, end_date, value):
+                self.start_date = start_date
+                self.end_date = end_date
+                self.value = value
+
+        bets = [
+            FakeBet(date(2017, 1, 1), date(2017, 3, 31), Decimal(100)),
+            FakeBet(date(2017, 4, 1), None, Decimal(50)),
+        ]
+        dates = [date(2017, 1, 10), date(2017, 4, 10)]
+
+        self.assertEqual(expected_amounts(bets, dates), [[0, 300], [0, 50]])
+        self.assertEqual(total_expected_amounts(bets, dates), [0, 350])
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_parity_with_database_function(self):
+        value = Decimal("97.17")
+        grid = [
+            (start_date, end_date, today)
+            for start_date in _start_dates()
+            for end_date in _end_dates()
+            if end_date is None or end_date > start_date
+            for today in _today_dates()
+        ]
+        starts, ends, todays = (list(column) for column in zip(*grid))
+
+        result = db.session.execute(
+            text(
+                """
+                select get_expected_today(g.start_date, g.end_date, :value, g.today) as amount,
+                       get_expected_at(g.start_date, g.end_date, :value, g.today) as amount_at
+                from unnest(cast(:starts as date[]), cast(:ends as date[]), cast(:todays as date[]))
+                     with ordinality as g(start_date, end_date, today, position)
+                order by g.position
+                """
+            ),
+            {"starts": starts, "ends": ends, "todays": todays, "value": value},
+        )
+        rows = result.all()
+        from_database = [row.amount for row in rows]
+
+        mismatches = [
+            (start_date, end_date, today, row.amount, row.amount_at)
+            for (start_date, end_date, today), row in zip(grid, rows)
+            if expected_amount(start_date, end_date, value, today) != row.amount
+            or row.amount != row.amount_at
+        ]
+
+        self.assertGreater(len(from_database), 10000)
+        self.assertEqual(mismatches, [])
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_get_expected_at_can_be_inlined(self):
+        volatility, parallel, language = db.session.execute(
+            text(
+                """
+                select provolatile, proparallel, lanname
+                from pg_proc join pg_language on pg_language.oid = pg_proc.prolang
+                where proname = 'get_expected_at'
+                """
+            )
+        ).one()
+
+        self.assertEqual((volatility, parallel, language), ("i", "s", "sql"))
@@ -0,0 +1,87 @@
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+from solawi.fints_import import save_transactions
+from solawi.models import Deposit, Member, PaymentStatus, Person, Share
+from test_factories import PersonFactory
+from test_helpers import DBTest
+
+
+def make_transaction(name, amount, day, purpose="Beitrag"):
+    return SimpleNamespace(
+        data={
+            "applicant_name": name,
+            "amount": SimpleNamespace(amount=amount),
+            "date": day,
+            "purpose": purpose,
+        }
+    )
+
+
+class FinTSImportTest(DBTest):
+    @pytest.mark.usefixtures("app_ctx")
+    def test_save_transactions_creates_persons_and_shares(self):
+        transactions = [
+            make_transaction("Jane Doe", "90.00", date(2020, 1, 1)),
+            make_transaction("Jane Doe", "90.00", date(2020, 2, 1)),
+            make_transaction("John Doe", "50.00", date(2020, 1, 3)),
+            make_transaction("Bank", "-5.00", date(2020, 1, 3)),
+        ]
+
+        result = save_transactions(transactions, batch_size=2)
+
+        self.assertEqual(result.inserted, 3)
+        self.assertEqual(result.skipped, 0)
+        self.assertEqual(Deposit.query.count(), 3)
+        self.assertEqual(Person.query.count(), 2)
+        self.assertEqual(Share.query.count(), 2)
+        self.assertEqual(sorted(member.name for member in Member.query), ["Jane Doe", "John Doe"])
+        jane = Person.query.filter_by(name="Jane Doe").one()
+        self.assertEqual(jane.share.members[0].name, "Jane Doe")
+        self.assertEqual(PaymentStatus.get(jane.share_id).total_deposits, 180)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_save_transactions_skips_duplicates(self):
+        transactions = [
+            make_transaction("Jane Doe", "90.00", date(2020, 1, 1)),
+            make_transaction("Jane Doe", "90.00", date(2020, 2, 1)),
+        ]
+        save_transactions(transactions[:1])
+
+        result = save_transactions(transactions)
+
+        self.assertEqual(result.inserted, 1)
+        self.assertEqual(result.skipped, 1)
+        self.assertEqual(Deposit.query.count(), 2)
+        self.assertEqual(Share.query.count(), 1)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_save_transactions_without_name_twice(self):
+        transactions = [
+            make_transaction(None, "90.00", date(2020, 1, 1)),
+            make_transaction("Jane Doe", "10.00", date(2020, 1, 2)),
+        ]
+
+        save_transactions(transactions)
+        result = save_transactions(transactions)
+
+        self.assertEqual(result.inserted, 0)
+        self.assertEqual(result.skipped, 2)
+        self.assertEqual(Deposit.query.count(), 2)
+        self.assertEqual(Person.query.count(), 2)
+        self.assertEqual(Share.query.count(), 2)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_save_transactions_uses_existing_person(self):
+        person = PersonFactory.create(name="Jane Doe")
+
+        save_transactions([make_transaction("Jane Doe", "90.00", date(2020, 1, 1), purpose=None)])
+
+        deposit = Deposit.query.one()
+        self.assertEqual(deposit.person_id, person.id)
+        self.assertEqual(deposit.amount, Decimal("90.00"))
+        self.assertIsNone(deposit.title)
+        self.assertEqual(Share.query.count(), 1)
@@ -1,13 +1,31 @@
 import os
 import unittest
+from contextlib import contextmanager
 
 import pytest
 from flask_jwt_extended import create_access_token
+from sqlalchemy import event
 
 from solawi.app import app, db
+from solawi.auth import revocations, user_cache
 from test_factories import UserFactory
 
 
+@contextmanager
+def captured_statements():
+    """Collects the `(statement, parameters)` of every statement that is sent to the database"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", capture)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", capture)
+
+
 class DBTest(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -30,6 +48,8 @@ class DBTest(unittest.TestCase):
                 db.session.query(table).delete()
             db.session.commit()
             db.session.remove()
+        user_cache.clear()
+        revocations.clear()
 
 
 class AuthorizedTest(DBTest):
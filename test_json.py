@@ -0,0 +1,52 @@
+import unittest
+from datetime import date, datetime
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+
+from benchmarks.json_providers import payment_status_payload
+from solawi.app import CustomJSONProvider, OrjsonJSONProvider, app, orjson
+from test_factories import BetFactory, DepositFactory, MemberFactory, PersonFactory
+from test_helpers import AuthorizedTest
+
+
+@unittest.skipIf(orjson is None, "orjson is not installed")
+class OrjsonJSONProviderTest(unittest.TestCase):
+    def assertSameOutput(self, obj):
+        default, fast = CustomJSONProvider(app), OrjsonJSONProvider(app)
+        self.assertEqual(
+            fast.dumps(obj, separators=(",", ":")), default.dumps(obj, separators=(",", ":"))
+        )
+        self.assertEqual(fast.dumps(obj, indent=2), default.dumps(obj, indent=2))
+
+    def test_payment_status_payload(self):
+        self.assertSameOutput(payment_status_payload(500))
+
+    def test_special_values(self):
+        self.assertSameOutput(
+            {
+                "text": 'Jürgen 😀 \x7f \x01\n\t"\\ ',
+                "amounts": [Decimal("97.17"), Decimal("-0.5"), Decimal("1e-7"), Decimal("1e17")],
+                "dates": [date(2020, 1, 2), datetime(2020, 1, 2, 3, 4, 5, 123)],
+                "other": [None, True, 1.5, 10**15, [], {}, {3: "integer", 1: "keys"}],
+            }
+        )
+
+
+@unittest.skipIf(orjson is None, "orjson is not installed")
+class OrjsonResponseTest(AuthorizedTest):
+    @pytest.mark.usefixtures("app_ctx")
+    def test_responses_are_identical(self):
+        person = PersonFactory.create(name="Jürgen Müller")
+        MemberFactory.create(name="Jürgen Müller", share=person.share)
+        BetFactory.create(share=person.share, value=Decimal("97.17"))
+        DepositFactory.create(person=person, amount=Decimal("12.34"), title="Beitrag für Mai")
+
+        responses = []
+        for provider in [CustomJSONProvider(app), OrjsonJSONProvider(app)]:
+            with patch.object(app, "json", provider):
+                for url in ["/api/v1/shares/payment_status", f"/api/v1/shares/{person.share_id}"]:
+                    responses.append(self.app.get(url, buffered=True).data)
+
+        self.assertEqual(responses[:2], responses[2:])
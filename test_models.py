@@ -1,9 +1,26 @@
+import threading
 from datetime import date, datetime
 from decimal import Decimal
+from typing import Iterator
 
 import pytest
-
-from solawi.models import Bet, Deposit, Person, User
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import class_mapper
+
+from solawi import read_models
+from solawi.app import app, db
+from solawi.models import (
+    BaseModel,
+    Bet,
+    Deposit,
+    Member,
+    PaymentStatus,
+    Person,
+    Share,
+    Station,
+    TableRevision,
+    User,
+)
 from test_factories import (
     BetFactory,
     DepositFactory,
@@ -12,7 +29,7 @@ from test_factories import (
     ShareFactory,
     UserFactory,
 )
-from test_helpers import DBTest
+from test_helpers import DBTest, captured_statements
 
 
 class DepositTest(DBTest):
@@ -66,6 +83,21 @@ class BetTest(DBTest):
         }
         assert bet.json == expected
 
+    @pytest.mark.usefixtures("app_ctx")
+    def test_jsonify_from_row(self):
+        bet = BetFactory()
+
+        row = db.session.execute(select(*Bet.json_columns()).where(Bet.id == bet.id)).one()
+
+        assert Bet.json_from_row(row) == bet.json
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_serializers_cover_all_columns(self):
+        for model in BaseModel.__subclasses__():
+            columns = class_mapper(model).columns
+            assert model.json_columns() == tuple(columns)
+            assert set(model._json_fields) == {column.name for column in columns}
+
     @pytest.mark.usefixtures("app_ctx")
     def test_expected_today(self):
         bet = BetFactory.create(
@@ -402,3 +434,145 @@ class ModelTest(DBTest):
         )
         bet.save()
         self.assertEqual(bet.expected_at(date(2023, 2, 28)), 100)
+
+
+class PaymentStatusTest(DBTest):
+    @pytest.mark.usefixtures("app_ctx")
+    def test_concurrent_deposits(self):
+        person_id = PersonFactory.create().id
+        share_id = Person.get(person_id).share_id
+        flushed = [threading.Event(), threading.Event()]
+
+        def add_deposit(index, amount):
+            with app.app_context():
+                if index == 1:
+                    flushed[0].wait(5)
+                db.session.add(
+                    Deposit(
+                        amount=amount,
+                        timestamp=datetime(2024, 4, 1),
+                        title=f"Payment {index}",
+                        person_id=person_id,
+                    )
+                )
+                db.session.flush()
+                flushed[index].set()
+                if index == 0:
+                    # the second flush waits for this commit, so it may not finish before it
+                    flushed[1].wait(1)
+                db.session.commit()
+
+        threads = [threading.Thread(target=add_deposit, args=args) for args in [(0, 10), (1, 20)]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(PaymentStatus.get(share_id).total_deposits, Decimal("30.00"))
+
+
+class TableRevisionTest(DBTest):
+    def revisions(self):
+        revisions = TableRevision.get_revisions(["station", "share"])
+        return revisions.get("station", 0), revisions.get("share", 0)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_bumped_once_per_transaction_on_commit(self):
+        station, share = self.revisions()
+        db.session.commit()
+
+        db.session.add(Station(name="Station 1"))
+        db.session.flush()
+        db.session.add(Station(name="Station 2"))
+        db.session.flush()
+
+        self.assertEqual(self.revisions(), (station, share))
+        db.session.commit()
+        self.assertEqual(self.revisions(), (station + 1, share))
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_not_bumped_on_rollback(self):
+        station, share = self.revisions()
+        db.session.commit()
+
+        db.session.add(Station(name="Station 1"))
+        db.session.flush()
+        db.session.rollback()
+        db.session.add(Share())
+        db.session.commit()
+
+        self.assertEqual(self.revisions(), (station, share + 1))
+
+
+class IndexUsageTest(DBTest):
+    """
+    Runs the hot queries on a seeded dataset and checks with `EXPLAIN` that they
+    do not scan the large tables sequentially.
+    """
+
+    LARGE_TABLES = {"deposit", "person", "bet", "member"}
+
+    def _seed(self):
+        statements = [
+            "insert into share (archived) select false from generate_series(1, 2000)",
+            "insert into person (name, share_id) select 'Person ' || id, id from share",
+            "insert into member (name, share_id) select 'Member ' || id, id from share",
+            """
+            insert into bet (value, start_date, share_id)
+            select 90, date '2020-01-01' + (n * interval '1 year'), share.id
+            from share, generate_series(0, 1) n
+            """,
+            """
+            insert into deposit (amount, timestamp, title, person_id, is_security, ignore)
+            select 90, timestamp '2020-01-01' + (n * interval '1 month'), 'Beitrag', person.id,
+                   false, false
+            from person, generate_series(1, 20) n
+            """,
+            "analyze",
+        ]
+        for statement in statements:
+            db.session.execute(text(statement))
+        db.session.commit()
+        return db.session.scalar(select(func.max(Share.id)))
+
+    def _captured_statements(self, fn):
+        with captured_statements() as statements:
+            result = fn()
+            if isinstance(result, Iterator):
+                list(result)
+        return [
+            (statement, parameters)
+            for statement, parameters in statements
+            if statement.lstrip().lower().startswith("select")
+        ]
+
+    def _sequential_scans(self, plan):
+        scans = set()
+        if plan["Node Type"] == "Seq Scan":
+            scans.add(plan["Relation Name"])
+        for child in plan.get("Plans", []):
+            scans |= self._sequential_scans(child)
+        return scans
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_hot_queries_use_indexes(self):
+        share_id = self._seed()
+        hot_queries = {
+            "share deposits": lambda: Share.get_deposits(share_id),
+            "share bets": lambda: Share.get_bets(share_id),
+            "payment summary": lambda: Share.get_payment_summary(share_id),
+            "latest import": Deposit.latest_import,
+            "share list": lambda: read_models.share_list(limit=50),
+            "member list": lambda: Member.get_list(limit=50),
+        }
+
+        for name, fn in hot_queries.items():
+            statements = self._captured_statements(fn)
+            self.assertTrue(statements, name)
+            cursor = db.session.connection().connection.cursor()
+            for statement, parameters in statements:
+                cursor.execute(f"explain (format json) {statement}", parameters)
+                plan = cursor.fetchone()[0][0]["Plan"]
+                self.assertEqual(
+                    self._sequential_scans(plan) & self.LARGE_TABLES, set(), f"{name}: {statement}"
+                )
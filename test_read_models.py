@@ -0,0 +1,75 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from solawi import concurrent_reads, read_models
+from solawi.models import PaymentStatus, Share
+from test_factories import (
+    BetFactory,
+    DepositFactory,
+    MemberFactory,
+    PersonFactory,
+    ShareFactory,
+    StationFactory,
+)
+from test_helpers import DBTest
+
+
+class ReadModelsTest(DBTest):
+    def _create_shares(self):
+        station = StationFactory.create(name="Station 1")
+        share = ShareFactory.create(station=station, note="a note")
+        for name in ["Zoë", "anna", "Émile", "Bob", "", None]:
+            MemberFactory.create(name=name, share=share)
+        BetFactory.create(share=share, value=Decimal("97.17"), end_date=date(2019, 12, 31))
+        BetFactory.create(share=share, value=90, start_date=date(2020, 1, 1))
+        DepositFactory.create(person=PersonFactory.create(share=share), amount=Decimal("12.34"))
+        ShareFactory.create(station=None)
+        return share
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_share_list_matches_share_json(self):
+        self._create_shares()
+
+        expected = [share.json for share in Share.query.order_by(Share.id)]
+        for share in expected:
+            share["bets"] = sorted(share["bets"], key=lambda bet: bet["id"])
+
+        self.assertEqual(list(read_models.share_list()), expected)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_share_list_pages(self):
+        share = self._create_shares()
+
+        shares = list(read_models.share_list(limit=1))
+
+        self.assertEqual([row["id"] for row in shares], [share.id, share.id + 1])
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_payment_status_list(self):
+        share = self._create_shares()
+        payment_status = PaymentStatus.get(share.id)
+
+        first, second = read_models.payment_status_list()
+
+        self.assertEqual(first["name"], "Bob & Zoë & anna & Émile")
+        self.assertEqual(first["station_name"], "Station 1")
+        self.assertEqual(first["total_deposits"], Decimal("12.34"))
+        self.assertEqual(
+            first["difference_today"], Decimal("12.34") - payment_status.expected_today
+        )
+        self.assertEqual(second["name"], "")
+        self.assertEqual(second["station_name"], "")
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_concurrent_payment_status_list_matches_snapshot(self):
+        share = self._create_shares()
+
+        self.assertEqual(
+            concurrent_reads.payment_status_list(), list(read_models.payment_status_list())
+        )
+        self.assertEqual(
+            concurrent_reads.payment_status_list(after=share.id, limit=1),
+            list(read_models.payment_status_list(after=share.id, limit=1)),
+        )
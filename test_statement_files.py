@@ -0,0 +1,170 @@
+import os
+import tempfile
+import unittest
+from datetime import date
+from decimal import Decimal
+
+from solawi.statement_files import CAMT053, MT940, guess_format, read_statement_file
+
+MT940_STATEMENTS = """:20:STARTUMS
+:25:10020030/1234567
+:28C:0
+:60F:C200101EUR0,00
+:61:2001020102CR90,00NMSCNONREF
+:86:166?00GUTSCHRIFT?20Beitrag Januar?32Jane Doe
+:61:2001030103DR5,00NMSCNONREF
+:86:805?00ENTGELT?20Kontofuehrung?32Bank
+:62F:C200103EUR85,00
+-
+:20:STARTUMS
+:25:10020030/1234567
+:28C:0
+:60F:C200103EUR85,00
+:61:2002010201CR90,00NMSCNONREF
+:86:166?00GUTSCHRIFT?20Beitrag Februar?32Jane Doe
+:62F:C200201EUR175,00
+-
+"""
+
+CAMT053_STATEMENT = """<?xml version="1.0" encoding="UTF-8"?>
+<Document xmlns="urn:iso:std:iso:20022:tech:xsd:camt.053.001.02">
+  <BkToCstmrStmt>
+    <Stmt>
+      <Ntry>
+        <Amt Ccy="EUR">90.00</Amt>
+        <CdtDbtInd>CRDT</CdtDbtInd>
+        <BookgDt><Dt>2020-01-02</Dt></BookgDt>
+        <NtryDtls>
+          <TxDtls>
+            <RltdPties><Dbtr><Nm>Jane Doe</Nm></Dbtr></RltdPties>
+            <RmtInf><Ustrd>Beitrag Januar</Ustrd></RmtInf>
+          </TxDtls>
+        </NtryDtls>
+      </Ntry>
+      <Ntry>
+        <Amt Ccy="EUR">5.00</Amt>
+        <CdtDbtInd>DBIT</CdtDbtInd>
+        <BookgDt><Dt>2020-01-03</Dt></BookgDt>
+        <AddtlNtryInf>Kontofuehrung</AddtlNtryInf>
+      </Ntry>
+    </Stmt>
+  </BkToCstmrStmt>
+</Document>
+"""
+
+CAMT053_BATCH_STATEMENT = """<?xml version="1.0" encoding="UTF-8"?>
+<Document xmlns="urn:iso:std:iso:20022:tech:xsd:camt.053.001.02">
+  <BkToCstmrStmt>
+    <Stmt>
+      <Ntry>
+        <Amt Ccy="EUR">150.00</Amt>
+        <CdtDbtInd>CRDT</CdtDbtInd>
+        <BookgDt><Dt>2020-02-03</Dt></BookgDt>
+        <AddtlNtryInf>Sammelgutschrift</AddtlNtryInf>
+        <NtryDtls>
+          <Btch><NbOfTxs>2</NbOfTxs></Btch>
+          <TxDtls>
+            <AmtDtls><TxAmt><Amt Ccy="EUR">90.00</Amt></TxAmt></AmtDtls>
+            <RltdPties><Dbtr><Nm>Jane Doe</Nm></Dbtr></RltdPties>
+            <RmtInf><Ustrd>Beitrag Februar</Ustrd></RmtInf>
+          </TxDtls>
+          <TxDtls>
+            <AmtDtls><TxAmt><Amt Ccy="EUR">60.00</Amt></TxAmt></AmtDtls>
+            <RltdPties><Dbtr><Nm>John Doe</Nm></Dbtr></RltdPties>
+          </TxDtls>
+        </NtryDtls>
+      </Ntry>
+      <Ntry>
+        <Amt Ccy="EUR">80.00</Amt>
+        <CdtDbtInd>CRDT</CdtDbtInd>
+        <BookgDt><Dt>2020-02-04</Dt></BookgDt>
+        <NtryDtls>
+          <TxDtls>
+            <Amt Ccy="EUR">30.00</Amt>
+            <RltdPties><Dbtr><Nm>Jane Doe</Nm></Dbtr></RltdPties>
+          </TxDtls>
+          <TxDtls>
+            <Amt Ccy="EUR">50.00</Amt>
+            <RltdPties><Dbtr><Pty><Nm>John Doe</Nm></Pty></Dbtr></RltdPties>
+          </TxDtls>
+        </NtryDtls>
+      </Ntry>
+    </Stmt>
+  </BkToCstmrStmt>
+</Document>
+"""
+
+
+def write_file(content, suffix):
+    statement_file = tempfile.NamedTemporaryFile("w", suffix=suffix, delete=False)
+    with statement_file:
+        statement_file.write(content)
+    return statement_file.name
+
+
+class StatementFilesTest(unittest.TestCase):
+    def test_guess_format(self):
+        self.assertEqual(guess_format("export.XML"), CAMT053)
+        self.assertEqual(guess_format("export.sta"), MT940)
+
+    def test_read_mt940(self):
+        path = write_file(MT940_STATEMENTS, ".sta")
+        self.addCleanup(os.remove, path)
+
+        transactions = list(read_statement_file(path))
+
+        self.assertEqual(
+            [
+                (
+                    transaction.data["applicant_name"],
+                    transaction.data["amount"].amount,
+                    transaction.data["date"],
+                )
+                for transaction in transactions
+            ],
+            [
+                ("Jane Doe", Decimal("90.00"), date(2020, 1, 2)),
+                ("Bank", Decimal("-5.00"), date(2020, 1, 3)),
+                ("Jane Doe", Decimal("90.00"), date(2020, 2, 1)),
+            ],
+        )
+        self.assertEqual(transactions[0].data["purpose"], "Beitrag Januar")
+
+    def test_read_camt053(self):
+        path = write_file(CAMT053_STATEMENT, ".xml")
+        self.addCleanup(os.remove, path)
+
+        transactions = list(read_statement_file(path))
+
+        self.assertEqual(len(transactions), 2)
+        credit, debit = transactions
+        self.assertEqual(credit.data["applicant_name"], "Jane Doe")
+        self.assertEqual(credit.data["purpose"], "Beitrag Januar")
+        self.assertEqual(credit.data["amount"].amount, Decimal("90.00"))
+        self.assertEqual(credit.data["date"], date(2020, 1, 2))
+        self.assertEqual(debit.data["amount"].amount, Decimal("-5.00"))
+        self.assertIsNone(debit.data["applicant_name"])
+
+    def test_read_camt053_batches(self):
+        path = write_file(CAMT053_BATCH_STATEMENT, ".xml")
+        self.addCleanup(os.remove, path)
+
+        transactions = list(read_statement_file(path))
+
+        self.assertEqual(
+            [
+                (
+                    transaction.data["applicant_name"],
+                    transaction.data["amount"].amount,
+                    transaction.data["date"],
+                    transaction.data["purpose"],
+                )
+                for transaction in transactions
+            ],
+            [
+                ("Jane Doe", Decimal("90.00"), date(2020, 2, 3), "Beitrag Februar"),
+                ("John Doe", Decimal("60.00"), date(2020, 2, 3), "Sammelgutschrift"),
+                ("Jane Doe", Decimal("30.00"), date(2020, 2, 4), None),
+                ("John Doe", Decimal("50.00"), date(2020, 2, 4), None),
+            ],
+        )
@@ -1,12 +1,15 @@
 from datetime import date
+from decimal import Decimal
 from unittest.mock import patch
 
 import pytest
-from flask_jwt_extended import create_access_token
+from flask_jwt_extended import create_access_token, decode_token
 from sqlalchemy import func, select
 
 from solawi.app import app, db
-from solawi.models import Bet, Deposit, Member, Share, User
+from solawi.auth import load_user, revocations, user_cache
+from solawi.fints_import import save_transactions
+from solawi.models import Bet, Deposit, Member, PaymentStatus, Person, Share, User
 from test_factories import (
     BetFactory,
     DepositFactory,
@@ -16,7 +19,8 @@ from test_factories import (
     StationFactory,
     UserFactory,
 )
-from test_helpers import AuthorizedTest, DBTest
+from test_fints_import import make_transaction
+from test_helpers import AuthorizedTest, DBTest, captured_statements
 
 
 class AuthorizedViewsTests(AuthorizedTest):
@@ -114,6 +118,40 @@ class AuthorizedViewsTests(AuthorizedTest):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.json["members"]), 1)
 
+    @pytest.mark.usefixtures("app_ctx")
+    def test_members_active_in_single_query(self):
+        without_share = MemberFactory.create(share=None)
+        without_bets = MemberFactory.create()
+        ShareFactory.create(members=[without_bets])
+        active = MemberFactory.create()
+        ShareFactory.create(members=[active], bets=[BetFactory.create(end_date=date(2999, 1, 1))])
+        for _ in range(5):
+            ShareFactory.create(members=[MemberFactory.create()], bets=[BetFactory.create()])
+
+        excluded_ids = [without_share.id, without_bets.id]
+        active_id = active.id
+        # the first request also loads the user and the revoked tokens
+        self.app.get("/api/v1/members", buffered=True)
+        with captured_statements() as statements:
+            response = self.app.get("/api/v1/members?active=true", buffered=True)
+
+        ids = [member["id"] for member in response.json["members"]]
+        self.assertIn(active_id, ids)
+        self.assertEqual(set(ids) & set(excluded_ids), set())
+        self.assertEqual(len(ids), 6)
+        # one statement for the ETag and one for the members
+        self.assertEqual(len(statements), 2)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_members_without_share(self):
+        member = MemberFactory.create(share=None)
+
+        response = self.app.get("/api/v1/members")
+
+        self.assertEqual(response.json["members"][0]["id"], member.id)
+        self.assertEqual(response.json["members"][0]["station_name"], "")
+        self.assertEqual(response.json["members"][0]["join_date"], "")
+
     @pytest.mark.usefixtures("app_ctx")
     def test_create_member(self):
         member1 = MemberFactory.create(name="Paul Wild / Paula Wilder")
@@ -342,6 +380,95 @@ class UserManagementViewsTests(DBTest):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json, {"users": ["my.user@example.org"]})
 
+    @pytest.mark.usefixtures("app_ctx")
+    def test_inactive_user_is_rejected(self):
+        user: User = UserFactory.create(active=False)
+        self._login_as_user(user)
+
+        response = self.app.get("/api/v1/users")
+
+        self.assertEqual(response.status_code, 401)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_user_is_cached_between_requests(self):
+        user: User = UserFactory.create()
+        self._login_as_user(user)
+
+        self.app.get("/api/v1/users")
+        with patch("solawi.auth.db") as mock_db:
+            response = self.app.get("/api/v1/users")
+
+        self.assertEqual(response.status_code, 200)
+        mock_db.session.execute.assert_not_called()
+        self.assertEqual(user_cache.get(user.email).id, user.id)
+
+    def _login_with_password(self, email, password):
+        response = self.app.post("/api/v1/login", json={"email": email, "password": password})
+        self.app.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {response.json['access_token']}"
+        return response.json["access_token"]
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_login_embeds_claims(self):
+        user: User = UserFactory.create(email="user@example.org", password="hunter2")
+
+        token = self._login_with_password("user@example.org", "hunter2")
+
+        claims = decode_token(token)
+        self.assertEqual(claims["uid"], user.id)
+        self.assertEqual(claims["active"], True)
+        self.assertEqual(claims["password_changed_at"], user.password_changed_at.isoformat())
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_claims_authorize_reads_without_user_lookup(self):
+        UserFactory.create(email="user@example.org", password="hunter2")
+        self._login_with_password("user@example.org", "hunter2")
+
+        with patch.dict(app.config, {"JWT_CLAIMS_AUTHORIZATION": True}):
+            with patch("solawi.api.load_user") as mock_load_user:
+                response = self.app.get("/api/v1/users")
+
+        self.assertEqual(response.status_code, 200)
+        mock_load_user.assert_not_called()
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_claims_do_not_authorize_writes(self):
+        user: User = UserFactory.create(email="user@example.org", password="hunter2")
+        self._login_with_password("user@example.org", "hunter2")
+
+        with patch.dict(app.config, {"JWT_CLAIMS_AUTHORIZATION": True}):
+            with patch("solawi.api.load_user", wraps=load_user) as mock_load_user:
+                response = self.app.patch(
+                    f"/api/v1/users/{user.id}",
+                    json={"password": "a-password-of-appropriate-length"},
+                )
+
+        self.assertEqual(response.status_code, 200)
+        mock_load_user.assert_called_once_with("user@example.org")
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_revoked_token_is_rejected(self):
+        user: User = UserFactory.create(email="user@example.org", password="hunter2")
+        self._login_with_password("user@example.org", "hunter2")
+
+        revocations.revoke(user.id)
+        with patch.dict(app.config, {"JWT_CLAIMS_AUTHORIZATION": True}):
+            response = self.app.get("/api/v1/users")
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json, {"message": "This token has been revoked"})
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_modify_user_invalidates_cached_user(self):
+        user: User = UserFactory.create(password="hunter2")
+        self._login_as_user(user)
+
+        self.app.get("/api/v1/users")
+        self.app.patch(
+            f"/api/v1/users/{user.id}", json={"password": "a-password-of-appropriate-length"}
+        )
+
+        self.assertIsNone(user_cache.get(user.email))
+
 
 class SharesTests(AuthorizedTest):
     @pytest.mark.usefixtures("app_ctx")
@@ -434,6 +561,68 @@ class PaymentStatusTests(AuthorizedTest):
 
         self.assertEqual(response.json, expected)
 
+    @pytest.mark.usefixtures("app_ctx")
+    def test_get_shares_concurrent(self):
+        share = ShareFactory.create(station=StationFactory.create(name="Our Station"))
+        BetFactory.create(
+            value=99, start_date=date(2019, 1, 1), end_date=date(2019, 2, 1), share=share
+        )
+        DepositFactory.create(person=PersonFactory.create(share=share), amount=99)
+        expected = self.app.get("/api/v1/shares/payment_status").json
+
+        with patch.dict(app.config, {"CONCURRENT_READS": True}):
+            response = self.app.get("/api/v1/shares/payment_status")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, expected)
+        self.assertEqual(response.json["shares"][0]["station_name"], "Our Station")
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_get_shares_in_one_round_trip(self):
+        for _ in range(5):
+            share = ShareFactory.create()
+            BetFactory.create(share=share)
+            DepositFactory.create(person=PersonFactory.create(share=share))
+        # the first request also loads the user and rolls the snapshot forward
+        self.app.get("/api/v1/shares/payment_status", buffered=True)
+        with captured_statements() as statements:
+            response = self.app.get("/api/v1/shares/payment_status", buffered=True)
+
+        self.assertEqual(len(response.json["shares"]), 5)
+        # one statement each for the ETag, the outdated check and the payment list
+        self.assertEqual(len(statements), 3)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_get_shares_reflects_writes(self):
+        share = ShareFactory.create()
+        person = PersonFactory.create(share=share)
+        deposit = DepositFactory.create(person=person, amount=99)
+
+        self.app.patch(f"/api/v1/deposits/{deposit.id}", json={"is_security": True})
+        self.app.post(
+            f"/api/v1/shares/{share.id}/bets", json={"value": "50", "start_date": "2019-01-01"}
+        )
+        response = self.app.get("/api/v1/shares/payment_status")
+
+        (payment_status,) = response.json["shares"]
+        self.assertEqual(payment_status["total_deposits"], 0)
+        self.assertEqual(payment_status["total_security"], 99)
+        self.assertGreater(payment_status["expected_today"], 0)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_get_shares_rolls_outdated_rows_forward(self):
+        bet = BetFactory.create(value=99, start_date=date(2019, 1, 1), end_date=None)
+        payment_status = PaymentStatus.get(bet.share_id)
+        expected_today = payment_status.expected_today
+        payment_status.expected_today = 0
+        payment_status.calculated_on = date(2019, 1, 1)
+        db.session.commit()
+
+        response = self.app.get("/api/v1/shares/payment_status")
+
+        self.assertEqual(response.json["shares"][0]["expected_today"], expected_today)
+        self.assertEqual(PaymentStatus.get(bet.share_id).calculated_on, date.today())
+
 
 class ShareDetailsTests(AuthorizedTest):
     @pytest.mark.usefixtures("app_ctx")
@@ -451,14 +640,39 @@ class ShareDetailsTests(AuthorizedTest):
                 "id": 1,
                 "name": "",
                 "note": None,
+                "number_of_deposits": 0,
                 "station_id": 1,
                 "total_deposits": 0,
+                "total_security": 0,
             }
         }
 
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json, expected)
 
+    @pytest.mark.usefixtures("app_ctx")
+    def test_get_share_details_with_deposits(self):
+        share = ShareFactory.create()
+        BetFactory.create(
+            value=99, start_date=date(2019, 1, 1), end_date=date(2019, 2, 28), share=share
+        )
+        person = PersonFactory.create(share=share)
+        DepositFactory.create(person=person, amount=99)
+        DepositFactory.create(person=person, amount=120, is_security=True)
+        DepositFactory.create(person=person, amount=50, ignore=True)
+        other_person = PersonFactory.create()
+        DepositFactory.create(person=other_person, amount=500)
+
+        response = self.app.get(f"/api/v1/shares/{share.id}")
+
+        self.assertEqual(response.status_code, 200)
+        details = response.json["share"]
+        self.assertEqual(details["expected_today"], 198)
+        self.assertEqual(details["total_deposits"], 99)
+        self.assertEqual(details["total_security"], 120)
+        self.assertEqual(details["number_of_deposits"], 2)
+        self.assertEqual(details["difference_today"], -99)
+
     @pytest.mark.usefixtures("app_ctx")
     def test_get_share_details_404(self):
         response = self.app.get("/api/v1/shares/1337")
@@ -487,6 +701,57 @@ class ShareDetailsTests(AuthorizedTest):
         self.assertEqual(response.status_code, 400)
 
 
+class TimelineTests(AuthorizedTest):
+    @pytest.mark.usefixtures("app_ctx")
+    def test_get_share_timeline(self):
+        share = ShareFactory.create()
+        BetFactory.create(
+            value=100, start_date=date(2019, 1, 1), end_date=date(2019, 3, 31), share=share
+        )
+        person = PersonFactory.create(share=share)
+        DepositFactory.create(person=person, amount=100, timestamp=date(2019, 1, 3))
+        DepositFactory.create(person=person, amount=100, timestamp=date(2019, 2, 3))
+        DepositFactory.create(person=person, amount=100, timestamp=date(2019, 2, 4), ignore=True)
+        DepositFactory.create(
+            person=person, amount=90, timestamp=date(2019, 1, 3), is_security=True
+        )
+
+        response = self.app.get(f"/api/v1/shares/{share.id}/timeline")
+
+        self.assertEqual(response.status_code, 200)
+        timeline = response.json["timeline"]
+        self.assertEqual(
+            timeline[:4],
+            [
+                {"month": "2019-01-01", "expected": 100, "paid": 100, "difference": 0},
+                {"month": "2019-02-01", "expected": 200, "paid": 200, "difference": 0},
+                {"month": "2019-03-01", "expected": 300, "paid": 200, "difference": -100},
+                {"month": "2019-04-01", "expected": 300, "paid": 200, "difference": -100},
+            ],
+        )
+        self.assertEqual(timeline[-1]["month"], date.today().replace(day=1).isoformat())
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_get_share_timeline_404(self):
+        response = self.app.get("/api/v1/shares/1337/timeline")
+
+        self.assertEqual(response.status_code, 404)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_get_all_timelines(self):
+        share1 = BetFactory.create(start_date=date(2019, 1, 1)).share
+        share2 = BetFactory.create(start_date=date(2020, 1, 1)).share
+        ShareFactory.create()
+
+        response = self.app.get("/api/v1/shares/timeline")
+
+        self.assertEqual(response.status_code, 200)
+        shares = response.json["shares"]
+        self.assertEqual([share["id"] for share in shares], [share1.id, share2.id])
+        self.assertEqual(shares[0]["timeline"][0]["month"], "2019-01-01")
+        self.assertEqual(shares[1]["timeline"][0]["month"], "2020-01-01")
+
+
 class BetDetailsTests(AuthorizedTest):
     @pytest.mark.usefixtures("app_ctx")
     def test_delete_bet(self):
@@ -615,3 +880,506 @@ class DepositTest(AuthorizedTest):
         self.assertEqual(response.status_code, 200)
         new_deposit = Deposit.get(response.json["deposit"]["id"])
         self.assertEqual(new_deposit.amount, 200)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_post_bulk(self):
+        person = PersonFactory.create()
+        existing = DepositFactory.create(
+            person=person, amount=10, title="Cash", timestamp=date(2022, 4, 7)
+        )
+        deposit = {"amount": 10, "title": "Cash", "person_id": person.id}
+        share_id = person.share_id
+
+        response = self.app.post(
+            "/api/v1/deposits/bulk",
+            json={
+                "deposits": [
+                    {**deposit, "timestamp": "2022-04-07T00:00:00"},
+                    {**deposit, "timestamp": "2022-04-08", "is_security": True},
+                    {**deposit, "timestamp": "2022-04-09T00:00:00", "amount": 12.5},
+                    {**deposit, "timestamp": "2022-04-09T00:00:00", "amount": 12.5},
+                ]
+            },
+        )
+
+        self.assertEqual(response.status_code, 200)
+        statuses = response.json["deposits"]
+        self.assertEqual(
+            [status["status"] for status in statuses],
+            ["duplicate", "created", "created", "duplicate"],
+        )
+        self.assertEqual(Deposit.query.count(), 3)
+        created = Deposit.get(statuses[1]["id"])
+        self.assertTrue(created.is_security)
+        self.assertEqual(created.added_by, User.query.one().id)
+        self.assertEqual(Deposit.get(statuses[2]["id"]).amount, Decimal("12.5"))
+        self.assertNotIn(existing.id, [status["id"] for status in statuses])
+        self.assertEqual(PaymentStatus.get(share_id).total_deposits, Decimal("22.5"))
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_post_bulk_rounds_amounts(self):
+        person = PersonFactory.create()
+        deposit = {"title": "Cash", "timestamp": "2022-04-07", "person_id": person.id}
+
+        response = self.app.post(
+            "/api/v1/deposits/bulk",
+            json={"deposits": [{**deposit, "amount": 12.345}, {**deposit, "amount": 12.35}]},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        statuses = response.json["deposits"]
+        self.assertEqual([status["status"] for status in statuses], ["created", "duplicate"])
+        self.assertEqual(Deposit.get(statuses[0]["id"]).amount, Decimal("12.35"))
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_patch_bulk_by_filter(self):
+        share = ShareFactory.create()
+        person = PersonFactory.create(share=share)
+        refund = DepositFactory.create(
+            person=person, amount=-10, title="Refund 1", timestamp=date(2022, 4, 7)
+        )
+        other_refund = DepositFactory.create(
+            person=person, amount=-10, title="REFUND 2", timestamp=date(2022, 4, 30)
+        )
+        DepositFactory.create(
+            person=person, amount=-10, title="Refund 3", timestamp=date(2022, 5, 1)
+        )
+        DepositFactory.create(person=person, amount=50, title="Beitrag", timestamp=date(2022, 4, 8))
+        DepositFactory.create(amount=-10, title="Refund 4", timestamp=date(2022, 4, 8))
+        expected_ids = sorted([refund.id, other_refund.id])
+        share_id = share.id
+
+        response = self.app.patch(
+            "/api/v1/deposits/bulk",
+            json={
+                "changes": {"ignore": True},
+                "share_id": share_id,
+                "from_date": "2022-04-01",
+                "to_date": "2022-04-30",
+                "title_pattern": "refund%",
+            },
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["ids"], expected_ids)
+        self.assertEqual(
+            sorted(deposit.id for deposit in Deposit.query.filter_by(ignore=True)), expected_ids
+        )
+        self.assertEqual(PaymentStatus.get(share_id).total_deposits, 40)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_patch_bulk_by_ids(self):
+        deposits = [DepositFactory.create(is_security=False) for _ in range(3)]
+        ids = [deposit.id for deposit in deposits[:2]]
+
+        response = self.app.patch(
+            "/api/v1/deposits/bulk", json={"changes": {"is_security": True}, "ids": ids}
+        )
+
+        self.assertEqual(response.json["ids"], ids)
+        self.assertEqual(Deposit.query.filter_by(is_security=True).count(), 2)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_patch_bulk_requires_a_filter(self):
+        DepositFactory.create(ignore=False)
+
+        response = self.app.patch("/api/v1/deposits/bulk", json={"changes": {"ignore": True}})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Deposit.query.filter_by(ignore=True).count(), 0)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_patch_bulk_rejects_nulls(self):
+        deposit = DepositFactory.create(ignore=False)
+
+        response = self.app.patch(
+            "/api/v1/deposits/bulk", json={"changes": {"ignore": None}, "ids": [deposit.id]}
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Deposit.query.filter_by(ignore=False).count(), 1)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_post_bulk_unknown_person(self):
+        deposit = {"amount": 10, "title": "Cash", "timestamp": "2022-04-07", "person_id": 999}
+
+        response = self.app.post("/api/v1/deposits/bulk", json={"deposits": [deposit]})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Deposit.query.count(), 0)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_post_bulk_invalid_values(self):
+        person = PersonFactory.create()
+        deposit = {"amount": 10, "title": "Cash", "timestamp": "2022-04-07", "person_id": person.id}
+
+        for invalid in [{"timestamp": "not a date"}, {"amount": 1e12}]:
+            response = self.app.post(
+                "/api/v1/deposits/bulk", json={"deposits": [deposit, {**deposit, **invalid}]}
+            )
+
+            self.assertEqual(response.status_code, 400)
+            self.assertTrue(response.json["message"])
+        self.assertEqual(Deposit.query.count(), 0)
+
+
+class PaginationTests(AuthorizedTest):
+    @pytest.mark.usefixtures("app_ctx")
+    def test_shares_pages(self):
+        share_ids = sorted(ShareFactory.create().id for _ in range(5))
+
+        first_page = self.app.get("/api/v1/shares?limit=2")
+        second_page = self.app.get(f"/api/v1/shares?limit=2&after={first_page.json['next']}")
+        last_page = self.app.get(f"/api/v1/shares?limit=2&after={second_page.json['next']}")
+
+        self.assertEqual([share["id"] for share in first_page.json["shares"]], share_ids[:2])
+        self.assertEqual([share["id"] for share in second_page.json["shares"]], share_ids[2:4])
+        self.assertEqual([share["id"] for share in last_page.json["shares"]], share_ids[4:])
+        self.assertEqual(first_page.json["next"], share_ids[1])
+        self.assertIsNone(last_page.json["next"])
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_without_limit_returns_everything(self):
+        for _ in range(3):
+            StationFactory.create()
+
+        response = self.app.get("/api/v1/stations")
+
+        self.assertEqual(len(response.json["stations"]), 3)
+        self.assertNotIn("next", response.json)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_deposits_pages_with_fields(self):
+        person = PersonFactory.create()
+        deposit_ids = sorted(DepositFactory.create(person=person).id for _ in range(3))
+
+        response = self.app.get(
+            f"/api/v1/shares/{person.share_id}/deposits"
+            f"?limit=2&after={deposit_ids[0]}&fields=amount,title"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [set(deposit.keys()) for deposit in response.json["deposits"]],
+            [{"id", "amount", "title"}] * 2,
+        )
+        self.assertEqual([deposit["id"] for deposit in response.json["deposits"]], deposit_ids[1:])
+        self.assertIsNone(response.json["next"])
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_payment_status_and_members_pages(self):
+        for _ in range(3):
+            MemberFactory.create()
+
+        payment_status = self.app.get("/api/v1/shares/payment_status?limit=2&fields=name").json
+        members = self.app.get("/api/v1/members?limit=2&fields=name").json
+
+        self.assertEqual(len(payment_status["shares"]), 2)
+        self.assertEqual(set(payment_status["shares"][0].keys()), {"id", "name"})
+        self.assertEqual(payment_status["next"], payment_status["shares"][1]["id"])
+        self.assertEqual(len(members["members"]), 2)
+        self.assertEqual(members["next"], members["members"][1]["id"])
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_lists_are_streamed_in_batches(self):
+        for _ in range(5):
+            share = ShareFactory.create()
+            MemberFactory.create(share=share)
+            BetFactory.create(share=share)
+
+        with patch("solawi.api.STREAM_BATCH_SIZE", 2):
+            response = self.app.get("/api/v1/shares", buffered=True)
+            payment_status = self.app.get("/api/v1/shares/payment_status", buffered=True)
+
+        self.assertEqual(len(response.json["shares"]), 5)
+        self.assertTrue(all(len(share["bets"]) == 1 for share in response.json["shares"]))
+        self.assertTrue(all(share["name"] for share in payment_status.json["shares"]))
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_invalid_limit(self):
+        response = self.app.get("/api/v1/shares?limit=0")
+
+        self.assertEqual(response.status_code, 400)
+
+
+class ConditionalRequestTests(AuthorizedTest):
+    @pytest.mark.usefixtures("app_ctx")
+    def test_unchanged_list_is_not_modified(self):
+        ShareFactory.create()
+
+        response = self.app.get("/api/v1/shares", buffered=True)
+        etag = response.headers["ETag"]
+        with patch("solawi.api.read_models.share_list") as share_list:
+            not_modified = self.app.get("/api/v1/shares", headers={"If-None-Match": etag})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.headers["ETag"], etag)
+        share_list.assert_not_called()
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_etag_changes_on_write(self):
+        share = ShareFactory.create()
+        etag = self.app.get("/api/v1/shares", buffered=True).headers["ETag"]
+
+        BetFactory.create(share=share)
+        response = self.app.get("/api/v1/shares", headers={"If-None-Match": etag})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertEqual(len(response.json["shares"][0]["bets"]), 1)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_etag_changes_on_bulk_write(self):
+        person = PersonFactory.create()
+        deposits_url = f"/api/v1/shares/{person.share_id}/deposits"
+        etag = self.app.get(deposits_url, buffered=True).headers["ETag"]
+
+        save_transactions([make_transaction(person.name, "90.00", date(2020, 1, 1))])
+        response = self.app.get(deposits_url, headers={"If-None-Match": etag})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json["deposits"]), 1)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_etag_depends_on_query_string(self):
+        etag = self.app.get("/api/v1/stations", buffered=True).headers["ETag"]
+
+        response = self.app.get("/api/v1/stations?limit=1", headers={"If-None-Match": etag})
+
+        self.assertEqual(response.status_code, 200)
+
+
+class MergeSharesTests(AuthorizedTest):
+    @pytest.mark.usefixtures("app_ctx")
+    def test_merge(self):
+        share1, share2 = ShareFactory.create(), ShareFactory.create()
+
+        response = self.app.post(
+            "/api/v1/shares/merge", json={"share1": share1.id, "share2": share2.id}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Share.query.count(), 1)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_merge_into_unknown_share(self):
+        share = ShareFactory.create()
+
+        response = self.app.post("/api/v1/shares/merge", json={"share1": 9999, "share2": share.id})
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Share.query.count(), 1)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_merge_unknown_share(self):
+        share1, share2 = ShareFactory.create(note="first"), ShareFactory.create(note="second")
+        share1_id = share1.id
+
+        response = self.app.post(
+            "/api/v1/shares/merge",
+            json={"share1": share1_id, "share2": share2.id, "more_shares": [9999]},
+        )
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Share.query.count(), 2)
+        self.assertEqual(Share.get(share1_id).note, "first")
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_merge_into_itself(self):
+        share = ShareFactory.create()
+
+        response = self.app.post(
+            "/api/v1/shares/merge", json={"share1": share.id, "share2": share.id}
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Share.query.count(), 1)
+
+
+class SplitDepositsTests(AuthorizedTest):
+    @pytest.mark.usefixtures("app_ctx")
+    def test_split_deposits(self):
+        share1 = ShareFactory.create()
+        share2 = ShareFactory.create()
+        person = PersonFactory.create(share=share1)
+        DepositFactory.create(amount=10, person=person, timestamp=date(2020, 1, 1))
+        DepositFactory.create(amount=20, person=person, timestamp=date(2020, 2, 1))
+        url = f"/api/v1/person/{person.id}/split"
+        body = {"share_id": share2.id, "date": "2020-01-28"}
+
+        preview = self.app.post(url, json={**body, "dry_run": True})
+        response = self.app.post(url, json=body)
+
+        self.assertEqual(preview.json["virtual_person_id"], None)
+        self.assertEqual(preview.json["moved_deposits"], 1)
+        self.assertEqual(preview.json["moved_amount"], 10)
+        self.assertEqual(preview.json["remaining_amount"], 20)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {key: value for key, value in response.json.items() if key != "virtual_person_id"},
+            {key: value for key, value in preview.json.items() if key != "virtual_person_id"},
+        )
+        virtual_person = Person.get(response.json["virtual_person_id"])
+        self.assertEqual(virtual_person.share_id, share1.id)
+        self.assertEqual(Person.get(person.id).share_id, share2.id)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_split_deposits_twice(self):
+        share1, share2 = ShareFactory.create(), ShareFactory.create()
+        person = PersonFactory.create(share=share1)
+        DepositFactory.create(amount=10, person=person, timestamp=date(2020, 1, 1))
+        DepositFactory.create(amount=20, person=person, timestamp=date(2021, 1, 1))
+        url = f"/api/v1/person/{person.id}/split"
+
+        first = self.app.post(url, json={"share_id": share2.id, "date": "2020-06-01"})
+        repeated = self.app.post(url, json={"share_id": share2.id, "date": "2020-06-01"})
+        later = self.app.post(url, json={"share_id": share1.id, "date": "2021-06-01"})
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(repeated.status_code, 409)
+        self.assertEqual(later.status_code, 200)
+        self.assertEqual(later.json["moved_deposits"], 1)
+        self.assertEqual(Person.query.count(), 3)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_split_deposits_unknown_person(self):
+        share = ShareFactory.create()
+
+        response = self.app.post(
+            "/api/v1/person/999/split", json={"share_id": share.id, "date": "2020-01-28"}
+        )
+
+        self.assertEqual(response.status_code, 404)
+
+
+class BatchTests(AuthorizedTest):
+    @pytest.mark.usefixtures("app_ctx")
+    def test_onboarding(self):
+        station = StationFactory.create()
+        station_id = station.id
+
+        response = self.app.post(
+            "/api/v1/batch",
+            json={
+                "operations": [
+                    {"op": "create_share", "data": {"note": "new"}},
+                    {"op": "create_member", "data": {"name": "Anna", "share_id": "$0"}},
+                    {"op": "create_member", "data": {"name": "Bob", "share_id": "$0"}},
+                    {
+                        "op": "create_bet",
+                        "data": {"share_id": "$0", "value": "60", "start_date": "2024-04-01"},
+                    },
+                    {"op": "update_share", "id": "$0", "data": {"station_id": station_id}},
+                ]
+            },
+        )
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json["results"]
+        self.assertEqual(len(results), 5)
+        share = Share.query.one()
+        self.assertEqual(results[0]["id"], share.id)
+        self.assertEqual(share.name, "Anna & Bob")
+        self.assertEqual(share.station_id, station_id)
+        self.assertEqual(results[4]["station_id"], station_id)
+        self.assertEqual(results[3]["value"], 60)
+        self.assertEqual(PaymentStatus.get(share.id).expected_today, share.expected_today)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_member_without_share(self):
+        response = self.app.post(
+            "/api/v1/batch",
+            json={"operations": [{"op": "create_member", "data": {"name": "Anna"}}]},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["results"][0]["share_id"], Share.query.one().id)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_rolls_back_on_error(self):
+        response = self.app.post(
+            "/api/v1/batch",
+            json={
+                "operations": [
+                    {"op": "create_share", "data": {}},
+                    {"op": "create_member", "data": {"name": "Anna", "share_id": "$0"}},
+                    {"op": "create_bet", "data": {"share_id": "$0", "value": "60"}},
+                ]
+            },
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json["operation"], 2)
+        self.assertEqual(Share.query.count(), 0)
+        self.assertEqual(Member.query.count(), 0)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_rejects_forward_references(self):
+        response = self.app.post(
+            "/api/v1/batch",
+            json={
+                "operations": [
+                    {"op": "create_member", "data": {"name": "Anna", "share_id": "$1"}},
+                    {"op": "create_share", "data": {}},
+                ]
+            },
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json["operation"], 0)
+        self.assertEqual(Member.query.count(), 0)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_rejects_invalid_values(self):
+        person_id = PersonFactory.create().id
+
+        response = self.app.post(
+            "/api/v1/batch",
+            json={
+                "operations": [
+                    {"op": "create_share", "data": {}},
+                    {
+                        "op": "create_deposit",
+                        "data": {
+                            "amount": 10,
+                            "timestamp": "nope",
+                            "title": "Cash",
+                            "person_id": person_id,
+                        },
+                    },
+                ]
+            },
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json["operation"], 1)
+        self.assertEqual(Deposit.query.count(), 0)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_rejects_invalid_ids(self):
+        response = self.app.post(
+            "/api/v1/batch",
+            json={"operations": [{"op": "update_share", "id": "abc", "data": {"note": "new"}}]},
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    @pytest.mark.usefixtures("app_ctx")
+    def test_rejects_values_the_database_refuses(self):
+        person_id = PersonFactory.create().id
+        deposit = {"timestamp": "2024-04-01", "title": "Cash", "person_id": person_id}
+
+        response = self.app.post(
+            "/api/v1/batch",
+            json={
+                "operations": [
+                    {"op": "create_deposit", "data": {**deposit, "amount": 10}},
+                    {"op": "create_deposit", "data": {**deposit, "amount": 10**12}},
+                ]
+            },
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json["operation"], 1)
+        self.assertEqual(Deposit.query.count(), 0)